@@ -1,52 +1,55 @@
 """
-XXX: fix what/why
+Control characters used in IEC 62056-21 / DIN 66219 framing
+
+The plain names (SOH, STX, ...) are ints, so comparing them against an
+item from a bytes/bytearray is a plain integer compare. The *_B names
+are the one-byte bytes versions, for building frames.
 """
 
 
-class Char:
+class ControlByte(int):
     """
-    Magic char class that allows us to f"{ACK}" and bin[2] == ACK
+    Integer control character with a readable str() and repr()
 
     Example usage:
 
-        ACK = Char(6)
-        NAK = Char(21)
+        ACK = ControlByte(6)
+        NAK = ControlByte(21)
 
-        buf = f'{ACK}123\r\n'  # or ..{CR}{LF}
+        buf = ACK_B + b'123\r\n'  # or ..CR_B + LF_B
         assert len(buf) == 6
         assert buf[0] == ACK
-        assert buf.encode('ascii')[0] in (ACK, NAK)
+        assert buf[0] in (ACK, NAK)
+        assert f'{ACK}' == '\x06'
 
     """
-    def __init__(self, i):
-        self.i = i
-
-    def __eq__(self, other):
-        if isinstance(other, Char):
-            return self.i == other.i
-        elif isinstance(other, int):
-            return self.i == other
-        elif isinstance(other, (bytes, bytearray, str)) and len(other) == 1:
-            # NOTE: ord() may return high integers for unicode chars
-            return self.i == ord(other)
-        return False
+    __slots__ = ()
 
     def __str__(self):
-        return chr(self.i)
+        return chr(self)
 
     def __repr__(self):
-        if self.i < 32:
-            return '\x1b[1;34m^{}\x1b[0m'.format(chr(64 + self.i))
-        # elif self.i == 94:
+        if self < 32:
+            return '\x1b[1;34m^{}\x1b[0m'.format(chr(64 + self))
+        # elif self == 94:
         #     return '^^'
-        return chr(self.i)
-
-
-SOH = Char(1)
-STX = Char(2)
-ETX = Char(3)
-EOT = Char(4)
-ACK = Char(6)
-LF = Char(10)
-CR = Char(13)
-NAK = Char(21)
+        return chr(self)
+
+
+SOH = ControlByte(1)
+STX = ControlByte(2)
+ETX = ControlByte(3)
+EOT = ControlByte(4)
+ACK = ControlByte(6)
+LF = ControlByte(10)
+CR = ControlByte(13)
+NAK = ControlByte(21)
+
+SOH_B = bytes([SOH])
+STX_B = bytes([STX])
+ETX_B = bytes([ETX])
+EOT_B = bytes([EOT])
+ACK_B = bytes([ACK])
+LF_B = bytes([LF])
+CR_B = bytes([CR])
+NAK_B = bytes([NAK])
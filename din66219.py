@@ -4,53 +4,70 @@ except ImportError:
     from ctrlcode import EOT, ETX, SOH, STX
 
 
+# Below this payload size, a plain loop is faster than the SWAR fold.
+SWAR_MIN_SIZE = 64
+
+# Preallocated one-byte BCC suffixes.
+_BCC_BYTES = tuple(bytes([i]) for i in range(256))
+
+
+def _xor(mv):
+    "XOR all bytes in mv together, using one int as a wide SWAR register"
+    n = len(mv)
+    if n < SWAR_MIN_SIZE:
+        acc = 0
+        for ch in mv:
+            acc ^= ch
+        return acc
+
+    acc = int.from_bytes(mv, 'little')
+    # Fold the upper half onto the lower half until one uint64 is left.
+    while n > 8:
+        half = n >> 1
+        shift = half << 3
+        acc = (acc >> shift) ^ (acc & ((1 << shift) - 1))
+        n -= half
+    # Fold the 8 lanes down to a single byte.
+    acc ^= acc >> 32
+    acc ^= acc >> 16
+    acc ^= acc >> 8
+    return acc & 0xFF
+
+
+def _start(bstr):
+    "Return the position of the first SOH or STX"
+    soh = bstr.find(SOH)
+    stx = bstr.find(STX, 0, (soh if soh >= 0 else len(bstr)))
+    if stx >= 0:
+        return stx
+    if soh >= 0:
+        return soh
+    raise ValueError(f'expected SOH/STX in {bstr!r}')
+
+
 def append_bcc(bstr):
     if isinstance(bstr, str):
         bstr = bstr.encode('ascii')
 
-    bcc = 0
-    it = iter(bstr)
-    ch = None
-    cnt = 0
-    for ch in it:
-        cnt += 1
-        if ch in (SOH, STX):
-            break
-    for ch in it:
-        cnt += 1
-        bcc ^= ch
-        # if ch in (ETX, EOT):
-        #     break
-
-    if cnt != len(bstr) or ch not in (ETX, EOT):
-        raise ValueError(f'expected one ETX/EOT at end of {bstr!r}, got {ch}')
+    if not bstr or bstr[-1] not in (ETX, EOT):
+        raise ValueError(f'expected one ETX/EOT at end of {bstr!r}')
 
-    return bstr + bytearray([bcc])
+    bcc = _xor(memoryview(bstr)[_start(bstr) + 1:])
+    return bstr + _BCC_BYTES[bcc]
 
 
 def check_bcc(bstr):
     if isinstance(bstr, str):
         bstr = bstr.encode('ascii')
 
-    bcc = 0
-    it = iter(bstr)
-    ch = None
-    cnt = 0
-    for ch in it:
-        cnt += 1
-        if ch in (SOH, STX):
-            break
-    for ch in it:
-        cnt += 1
-        bcc ^= ch
-        if ch in (ETX, EOT):
-            break
-
-    if ch not in (ETX, EOT):
-        raise ValueError(f'expected ETX/EOT at end of {bstr!r}, got {ch}')
-    if cnt != (len(bstr) - 1):
-        raise ValueError(f'expected $BCC at end of {bstr!r}')
-
-    ch = next(it)
-    if ch != bcc:
+    if len(bstr) < 2 or bstr[-2] not in (ETX, EOT):
+        raise ValueError(f'expected ETX/EOT and $BCC at end of {bstr!r}')
+
+    start = _start(bstr)
+    end = len(bstr) - 2
+    if bstr.find(ETX, start, end) != -1 or bstr.find(EOT, start, end) != -1:
+        raise ValueError(f'expected $BCC right after ETX/EOT in {bstr!r}')
+
+    bcc = _xor(memoryview(bstr)[start + 1:-1])
+    if bstr[-1] != bcc:
         raise ValueError(f'$BCC mismatch {bstr!r} expected {bcc}')
@@ -3,31 +3,43 @@ import os
 import re
 import select
 import serial
-import signal
 import termios
 import time
 
-from ctrlcode import ACK, CR, EOT, ETX, LF, NAK, SOH, STX
+from ctrlcode import (
+    ACK_B, EOT_B, ETX_B, NAK, NAK_B, SOH, SOH_B, STX, STX_B)
 from din66219 import append_bcc, check_bcc
 from serialproxy import spawn_serialproxy_child
 
+# Constant frames, so we don't rebuild them for every received byte.
+BREAK_FRAME = append_bcc(SOH_B + b'B0' + ETX_B)
+IDENT_MSG = b'/ISK5ME162-0033\r\n'
+
+# Precompiled patterns for the read handlers.
+REQUEST_MESSAGE_RE = re.compile(
+    rb'/\?(?P<device_address>[A-Za-z0-9 ]{0,32})!\r\n\Z')
+ACK_OPT_SELECT_RE = re.compile(
+    ACK_B + rb'(?P<opt_v>\d)(?P<opt_z>\d)(?P<opt_y>\d)\r\n')
+PROGRAMMING_CMD_RE = re.compile(
+    b'(%s[^%s%s]+[%s%s].)' % (SOH_B, ETX_B, EOT_B, ETX_B, EOT_B),
+    re.DOTALL)
+
 
 class Dataset:
     def __init__(self, address, value, unit=None):
         self.address = address
         self.value = value
         self.unit = unit
+        self._address_b = address.encode('ascii')
 
     def as_dataline(self, with_address):
+        "Return dataset as ascii bytes, with or without the address"
+        value = self.value.encode('ascii')
         if self.unit:
-            value = f'{self.value}*{self.unit}'
-        else:
-            value = self.value
+            value = b'%s*%s' % (value, self.unit.encode('ascii'))
         if with_address:
-            ret = f'{self.address}({value})'
-        else:
-            ret = f'({value})'
-        return ret
+            return b'%s(%s)' % (self._address_b, value)
+        return b'(%s)' % (value,)
 
 
 class BaseDataProvider:
@@ -37,9 +49,47 @@ class BaseDataProvider:
             '0.0.0': self.get_device_address,
             'F.F': '0000000',
         }
+        self._version = 0  # increment whenever a value changes
+        # Preformatted datalines, filled on first use and updated by
+        # set_dataset() whenever a value changes.
+        self._formatted_with_addr = {}
+        self._formatted_without_addr = {}
+
+    def get_version(self, addresses):
+        """
+        Return a number that changes whenever any of the values change
+
+        Only values pushed through set_dataset() are tracked. If any of
+        addresses is not, return None: its value may change at any time.
+        """
+        for address in addresses:
+            if address not in self._formatted_with_addr:
+                return None
+        return self._version
 
     def get_data_readout_addresses(self):
-        return ['C.1.0', '0.0.0', 'F.F']
+        return ('C.1.0', '0.0.0', 'F.F')
+
+    def get_dataline(self, address, with_address):
+        "Return the formatted dataline for address as bytes"
+        # Only values pushed through set_dataset() are preformatted.
+        # Everything else goes through get_dataset() every time, as it
+        # may be computed or overridden.
+        table = (
+            self._formatted_with_addr if with_address
+            else self._formatted_without_addr)
+        try:
+            return table[address]
+        except KeyError:
+            pass
+        return self.get_dataset(address).as_dataline(with_address)
+
+    def set_dataset(self, address, value, unit=None):
+        "Store a changed value as preformatted datalines"
+        dataset = Dataset(address, value, unit)
+        self._formatted_with_addr[address] = dataset.as_dataline(True)
+        self._formatted_without_addr[address] = dataset.as_dataline(False)
+        self._version += 1
 
     def get_meter_serial(self):
         return '12345678'
@@ -66,6 +116,13 @@ class BaseDataProvider:
         return value
 
 
+def _as_bytes(data):
+    "Return data (str as ascii, or any bytes-like object) as bytes"
+    if isinstance(data, str):
+        return data.encode('ascii')
+    return bytes(data)  # no copy if it already is bytes
+
+
 class ResetState:
     def __init__(self, next_state):
         self.next_state = next_state
@@ -75,8 +132,9 @@ class ResetState:
 
 
 class ReadState:
-    def __init__(self, action):
+    def __init__(self, action, min_size=1):
         self.action = action
+        self.min_size = min_size  # don't call action on shorter buffers
 
     def __repr__(self):
         return '<ReadState(->{})'.format(self.action.__name__)
@@ -84,9 +142,7 @@ class ReadState:
 
 class WriteState:
     def __init__(self, data, next_state):
-        if isinstance(data, str):
-            data = data.encode('ascii')
-        self.data = data
+        self.data = _as_bytes(data)
         self.next_state = next_state
 
     def __repr__(self):
@@ -150,21 +206,42 @@ class Iec6205621CServer:
             # deal with 7-bit bytes or parity. Likely this is an
             # openpty() serial bridge. That's okay.
             print('NOTICE: connected to software instead of hardware')
+        try:
+            # On USB serial adapters (FTDI and friends), this sets
+            # ASYNC_LOW_LATENCY, so received bytes are passed on right
+            # away instead of after the (16ms) latency timer.
+            self._serial.set_low_latency_mode(True)
+        except (AttributeError, NotImplementedError, ValueError):
+            pass  # not Linux, or not a (USB) UART
 
         # Set up states:
         self.STATE_RECV_REQUEST_MESSAGE = ReadState(
-            self.read_request_message)
+            self.read_request_message, len(b'/?!\r\n'))
         self.STATE_RECV_ACK_OPT_SELECT = ReadState(
-            self.read_ack_opt_select)
+            self.read_ack_opt_select, len(b'\x06050\r\n'))
         self.STATE_RECV_CMD_IN_DATA_READOUT = ReadState(
             self.read_cmd_in_data_readout)
         self.STATE_RECV_CMD_IN_PROGRAMMING = ReadState(
             self.read_cmd_in_programming)
 
+        # Build the constant frames once. The build_* methods may be
+        # overridden (and may return str), so we don't use the module
+        # constants directly.
+        self._ident_msg = _as_bytes(self.build_identification_message())
+        self._break_msg = _as_bytes(self.build_break())
+        self._error_msg = _as_bytes(self.build_error())
+        self._prog_prompt = append_bcc(SOH_B + b'P0' + STX_B + b'()' + ETX_B)
+
+        # Built frames, keyed by dataprovider version.
+        self._data_readout_cache = (None, None)
+        self._prog_r1_cache = {}
+
         # Initialize state. (STATE_0 will possibly make you wait after
         # startup.)
         self.STATE_0 = ResetState(self.STATE_RECV_REQUEST_MESSAGE)
         self._state = self.STATE_RECV_REQUEST_MESSAGE
+        self._rx_at = 0.0
+        self._write_ready_at = 0.0
         self._set_state(self.STATE_RECV_REQUEST_MESSAGE)
 
     def _set_baud(self, new_baud):
@@ -175,6 +252,12 @@ class Iec6205621CServer:
     def _set_state(self, new_state):
         if new_state == self.STATE_RECV_REQUEST_MESSAGE:
             self._set_baud(300)
+        elif isinstance(new_state, WriteState):
+            # > The time between the reception of a message and the
+            # > transmission of an answer is: 200 ms <= t[r] <= 1500 ms
+            # Count from when the message was read, so the time spent
+            # building the reply counts towards t[r].
+            self._write_ready_at = self._rx_at + 0.2
         if new_state != self._state:
             print('state:', self._state, '->', new_state)
             self._state = new_state
@@ -193,33 +276,38 @@ class Iec6205621CServer:
         > and all leading zeros in the tariff device address are ignored
         > (i.e. 10203 = 010203 = 000010203).
         """
-        m = re.search(
-            b'/?(?P<device_address>[A-Za-z0-9 ]*)!\r\n$', mutable_buf)
+        # Only run the regex when a message could have been completed.
+        m = (
+            mutable_buf.endswith(b'\r\n') and
+            REQUEST_MESSAGE_RE.search(mutable_buf))
         if not m:
-            # Trim the buffer to 5+32 characters. So we can ignore
+            # Drop everything before the last "/" in one go, or else
+            # trim the buffer to 5+32 characters. So we can ignore
             # previous garbage.
+            slash = mutable_buf.rfind(b'/')
+            if slash > 0:
+                print('(trimming)', mutable_buf)
+                del mutable_buf[:slash]
             if len(mutable_buf) > 37:
                 print('(trimming)', mutable_buf)
-                mutable_buf[0:-37] = bytearray()
+                del mutable_buf[:-37]
             return None
 
-        # Must fetch contents of groupdict() before mutating mutable_buf!
-        params = dict((k, v.decode('ascii')) for k, v in m.groupdict().items())
-        print('<<', mutable_buf[0:m.endpos])
-        mutable_buf[0:m.endpos] = bytearray()
+        # Must fetch the match group before mutating mutable_buf!
+        device_address = m.group('device_address')
+        print('<<', mutable_buf[0:m.end()])
+        del mutable_buf[:m.end()]
 
         # When both the transmitted address and the tariff device
         # address contain only zeros, regardless of their respective
         # lengths, the addresses are considered equivalent.
-        if len(params['device_address']):
-            params['device_address'] = '{}{}'.format(
-                params['device_address'][0:-1].lstrip('0'),
-                params['device_address'][-1])
+        if device_address:
+            device_address = (
+                device_address[0:-1].lstrip(b'0') + device_address[-1:])
 
-        if self.on_request_message(**params):
+        if self.on_request_message(device_address.decode('ascii')):
             return WriteState(
-                self.build_identification_message(),
-                self.STATE_RECV_ACK_OPT_SELECT)
+                self._ident_msg, self.STATE_RECV_ACK_OPT_SELECT)
         else:
             # XXX?
             pass
@@ -246,18 +334,15 @@ class Iec6205621CServer:
         """
         if len(mutable_buf) < 6:
             return None
-        m = re.match(
-            (f'{ACK}(?P<opt_v>\\d)(?P<opt_z>\\d)(?P<opt_y>\\d)\\r\\n'
-             .encode('ascii')),
-            mutable_buf)
+        m = ACK_OPT_SELECT_RE.match(mutable_buf)
         if not m:
             # FIXME: log error/mismatch
             return self.STATE_0
 
         # Must fetch contents of groupdict() before mutating mutable_buf!
         params = dict((k, v.decode('ascii')) for k, v in m.groupdict().items())
-        print('<<', mutable_buf[0:m.endpos])
-        mutable_buf[0:m.endpos] = bytearray()
+        print('<<', mutable_buf[0:m.end()])
+        del mutable_buf[:m.end()]
 
         return self.on_ack_opt_select(**params)
 
@@ -294,13 +379,21 @@ class Iec6205621CServer:
         if len(mutable_buf) == 1 and mutable_buf[0] == NAK:
             # "Repeat request"
             raise NotImplementedError('should repeat last write')
-        elif mutable_buf == append_bcc(f'{SOH}B0{ETX}'):
-            print('<<', mutable_buf)
-            mutable_buf[:] = bytearray()
+
+        # A bulk read may hold more than just the break message.
+        pos = mutable_buf.find(self._break_msg)
+        if pos != -1:
+            end = pos + len(self._break_msg)
+            print('<<', mutable_buf[:end])
+            del mutable_buf[:end]
             return self.STATE_0
 
+        # Keep a possible break message start, else at most 5 bytes.
+        soh = mutable_buf.rfind(SOH)
+        if soh > 0:
+            del mutable_buf[:soh]
         if len(mutable_buf) > 5:
-            mutable_buf[0:-5] = bytearray()
+            del mutable_buf[:-5]
         return None
 
     def read_cmd_in_programming(self, mutable_buf):
@@ -313,30 +406,29 @@ class Iec6205621CServer:
 
         # Because in programming mode, failures result in a return to
         # this state, we'll drop non-SOH from the start.
-        while mutable_buf and mutable_buf[0] != SOH:
-            # Drop characters.
-            print('(dropping leading)', mutable_buf)
-            mutable_buf[0:1] = bytearray()
-            return None
-
-        if not mutable_buf:
+        idx = mutable_buf.find(SOH)
+        if idx == -1:
+            print('(dropping)', mutable_buf)
+            mutable_buf.clear()
             return None
+        elif idx:
+            print('(dropping leading)', mutable_buf[0:idx])
+            del mutable_buf[:idx]
 
         assert mutable_buf[0] == SOH, mutable_buf
-        m = re.search(
-            f'({SOH}[^{ETX}{EOT}]+[{ETX}{EOT}].)'.encode('ascii'), mutable_buf)
+        m = PROGRAMMING_CMD_RE.search(mutable_buf)
         if not m:
             # XXX: trim?
             return None
 
         result_buf = m.groups()[0]
-        print('<<', mutable_buf[0:m.endpos])
-        mutable_buf[0:m.endpos] = bytearray()
+        print('<<', mutable_buf[0:m.end()])
+        del mutable_buf[:m.end()]
 
         try:
             check_bcc(result_buf)
         except ValueError:
-            return WriteState(NAK, self.STATE_RECV_CMD_IN_PROGRAMMING)
+            return WriteState(NAK_B, self.STATE_RECV_CMD_IN_PROGRAMMING)
 
         if result_buf[1:3] == b'B0' and len(result_buf) == 5:
             # {SOH}B0{ETX}
@@ -354,7 +446,7 @@ class Iec6205621CServer:
             assert False, result_buf
 
         if len(mutable_buf) > 32:
-            mutable_buf[0:-32] = bytearray()
+            del mutable_buf[:-32]
         return None
 
     def on_request_message(self, device_address):
@@ -388,7 +480,7 @@ class Iec6205621CServer:
         }.get(int(opt_y))
 
         if (new_protocol is None or new_baud is None or
-                opt_z != self.build_identification_message()[4] or
+                ord(opt_z) != self._ident_msg[4] or
                 new_mode is None):
             # FIXME: log error/mismatch
             assert False, 'return -> statefail -> 300 data readout?'
@@ -398,8 +490,7 @@ class Iec6205621CServer:
 
         if new_mode == 'P':
             return WriteState(
-                append_bcc(f'{SOH}P0{STX}(){ETX}'),
-                self.STATE_RECV_CMD_IN_PROGRAMMING)
+                self._prog_prompt, self.STATE_RECV_CMD_IN_PROGRAMMING)
 
         assert new_mode == 'D', new_mode
         return WriteState(
@@ -438,7 +529,7 @@ class Iec6205621CServer:
         > maximum ("/" and "!" not allowed, and "\\" only allowed for
         > enhanced baud stuff).
         """
-        return '/ISK5ME162-0033\r\n'
+        return IDENT_MSG
 
     def build_break(self):
         """
@@ -480,7 +571,7 @@ class Iec6205621CServer:
         > 1 - complete sign-off for battery operated devices using the
         >     fast wake-up method
         """
-        return append_bcc(f'{SOH}B0{ETX}')
+        return BREAK_FRAME
 
     def build_error(self):
         """
@@ -490,7 +581,7 @@ class Iec6205621CServer:
         > of (, ), *, / and !. It is bounded by front and rear boundary
         > characters, as in the data set structure.
         """
-        return append_bcc(f'{STX}(ERROR){ETX}')
+        return append_bcc(STX_B + b'(ERROR)' + ETX_B)
 
     def build_data_readout(self):
         """
@@ -516,12 +607,25 @@ class Iec6205621CServer:
         > number of locations to read. (E.g. start at 1.8.0 and read 4
         > locations.)
         """
+        # Fetch the version before building: if fetching values changes
+        # them, the next call will not get the stale frame. A version
+        # of None means there are dynamic values: always rebuild.
         addresses = self._dataprovider.get_data_readout_addresses()
-        datalines = [
-            self._dataprovider.get_dataset(address).as_dataline(True)
-            for address in addresses]
-        datablock = ''.join(f'{dataline}{CR}{LF}' for dataline in datalines)
-        return append_bcc(f'{STX}{datablock}!{CR}{LF}{ETX}')
+        version = self._dataprovider.get_version(addresses)
+        if version is not None and self._data_readout_cache[0] == version:
+            return self._data_readout_cache[1]
+
+        # Collect all fragments and join them once, so the payload is
+        # copied a single time before the BCC pass.
+        get_dataline = self._dataprovider.get_dataline
+        parts = [STX_B]
+        for address in addresses:
+            parts.append(get_dataline(address, True))
+            parts.append(b'\r\n')
+        parts.append(b'!\r\n' + ETX_B)
+        ret = append_bcc(b''.join(parts))
+        self._data_readout_cache = (version, ret)
+        return ret
 
     def build_prog_r1(self, address):
         """
@@ -532,43 +636,101 @@ class Iec6205621CServer:
         1.8.0").
         """
         assert isinstance(address, str), address
-        value = self._dataprovider.get_dataset(address).as_dataline(False)
-        return append_bcc(f'{STX}{value}{ETX}')
-
-    def serve(self):
-        poll_read = select.poll()
-        poll_read.register(
-            self._serial.fileno(),
-            select.POLLHUP | select.POLLIN | select.POLLERR)
-        poll_write = select.poll()
-        poll_write.register(
-            self._serial.fileno(),
-            select.POLLHUP | select.POLLOUT | select.POLLERR)
+        version = self._dataprovider.get_version((address,))
+        try:
+            cached_version, ret = self._prog_r1_cache[address]
+        except KeyError:
+            pass
+        else:
+            if version is not None and cached_version == version:
+                return ret
+
+        value = self._dataprovider.get_dataline(address, False)
+        ret = append_bcc(STX_B + value + ETX_B)
+        self._prog_r1_cache[address] = (version, ret)
+        return ret
+
+    def _process_readbuf(self, readbuf):
+        """
+        Feed readbuf to the current ReadState action
+
+        Keep feeding it for as long as the action makes progress (by
+        consuming bytes or changing state), because a single bulk read
+        may hold more than one frame, or garbage followed by a frame.
+        Buffers shorter than the smallest frame of the state are not
+        parsed at all.
+        """
+        while (isinstance(self._state, ReadState) and
+                len(readbuf) >= self._state.min_size):
+            buflen = len(readbuf)
+            new_state = self._state.action(readbuf)
+            if new_state:
+                assert not isinstance(new_state, ReadState), new_state
+                self._set_state(new_state)
+            elif len(readbuf) == buflen:
+                break
+
+    def serve(self, watch_fd=None):
+        """
+        Serve until the serial device hangs up
+
+        If watch_fd is set (e.g. a pidfd of a child process), also stop
+        as soon as it becomes readable.
+        """
+        # Use a single poller for the serial fd. Only the event mask
+        # changes, when switching between reading and writing.
+        fd = self._serial.fileno()
+        mask_read = select.POLLHUP | select.POLLIN | select.POLLERR
+        mask_write = select.POLLHUP | select.POLLOUT | select.POLLERR
+        mask = mask_read
+        poller = select.poll()
+        poller.register(fd, mask)
+        if watch_fd is not None:
+            poller.register(watch_fd, select.POLLIN)
 
         readbuf = bytearray()  # reset at every state switch after write?
 
         while True:
-            if isinstance(self._state, ReadState):
-                evs = poll_read.poll(30)
+            if isinstance(self._state, ResetState):
+                # XXX: also wait/sleep?
+                self._set_state(self._state.next_state)
+                # Bytes after the frame that caused the reset (e.g. a
+                # new request right after a break) are still in readbuf.
+                self._process_readbuf(readbuf)
+                continue
+
+            is_read = isinstance(self._state, ReadState)
+            new_mask = mask_read if is_read else mask_write
+            if new_mask != mask:
+                mask = new_mask
+                poller.modify(fd, mask)
+            evs = poller.poll(30)
+            if len(evs) > 1 or (evs and evs[0][0] != fd):
+                break  # watch_fd fired
+
+            if is_read:
                 if evs and evs[0][1] == select.POLLIN:
-                    readbuf.extend(self._serial.read(1))
+                    # Drain everything that is available, instead of
+                    # doing a poll+read for every single byte.
+                    readbuf.extend(self._serial.read(
+                        max(1, self._serial.in_waiting)))
+                    self._rx_at = time.monotonic()
                     # #print('<<', readbuf)
-                    new_state = self._state.action(readbuf)
-                    if new_state:
-                        assert not isinstance(new_state, ReadState), new_state
-                        self._set_state(new_state)
+                    self._process_readbuf(readbuf)
                 elif evs and evs[0][1] & select.POLLHUP:
                     break
                 elif evs:
                     assert False, f'read? 30s? HUP? ERR? {evs}'
-            elif isinstance(self._state, WriteState):
-                evs = poll_write.poll(30)
+            else:
+                assert isinstance(self._state, WriteState), self._state
                 if evs and evs[0][1] == select.POLLOUT:
                     # FIXME: when not everything is written... we do?
-                    print('(waiting 200ms)')
-                    time.sleep(0.2)
+                    delay = self._write_ready_at - time.monotonic()
+                    if delay > 0:
+                        print(f'(waiting {delay * 1000:.0f}ms)')
+                        time.sleep(delay)
                     print('>>', self._state.data)
-                    self._serial.write(self._state.data)
+                    self._write_frame(self._state.data)
                     new_state = self._state.next_state
                     assert not isinstance(new_state, WriteState), new_state
                     self._set_state(new_state)
@@ -576,10 +738,14 @@ class Iec6205621CServer:
                     break
                 elif evs:
                     assert False, f'write? 30s? HUP? ERR? {evs}'
-            else:
-                assert isinstance(self._state, ResetState), self._state
-                # XXX: also wait/sleep?
-                self._set_state(self._state.next_state)
+
+    def _write_frame(self, frame):
+        "Write a complete frame with one write() and wait until it is out"
+        assert isinstance(frame, bytes), type(frame)
+        self._serial.write(frame)
+        # Drain (tcdrain), so a subsequent baudrate change or reply
+        # timing does not overlap with bytes still in the UART.
+        self._serial.flush()
 
     def close(self):
         self._serial.close()
@@ -592,17 +758,19 @@ class ExampleMe162DataProvider(BaseDataProvider):
         self._282 = 1516488
 
     def get_data_readout_addresses(self):
-        return [
+        return (
             'C.1.0', '0.0.0',
             '1.8.0', '1.8.1', '1.8.2', '2.8.0', '2.8.1', '2.8.2',
-            'F.F']
+            'F.F')
 
-    def get_dataset(self, address):
+    def get_dataline(self, address, with_address):
         # Hackery to increment the 1.8.[02] and 2.8.[02] values during
         # readout testing.
         if address == '1.8.0':
             self._bogus_increment()
+        return super().get_dataline(address, with_address)
 
+    def get_dataset(self, address):
         if address == '1.8.0':
             return self._make_kwh_dataset(address, 0 + self._182)
         elif address == '1.8.1':
@@ -620,9 +788,19 @@ class ExampleMe162DataProvider(BaseDataProvider):
     def _bogus_increment(self):
         self._182 += 10
         self._282 += 5
+        # Only the changed entries are reformatted.
+        for address, watthour in (
+                ('1.8.0', self._182), ('1.8.2', self._182),
+                ('2.8.0', self._282), ('2.8.2', self._282)):
+            self.set_dataset(address, *self._format_kwh(watthour))
 
     def _make_kwh_dataset(self, address, watthour):
-        return Dataset(address, '{:011.3f}'.format(watthour / 1000.0), 'kWh')
+        return Dataset(address, *self._format_kwh(watthour))
+
+    @staticmethod
+    def _format_kwh(watthour):
+        # Integer formatting of 0033402.264; no float rounding involved.
+        return f'{watthour // 1000:07d}.{watthour % 1000:03d}', 'kWh'
 
 
 def main():
@@ -630,15 +808,6 @@ def main():
     Start ExposedSerialProxy, start Iec6205621CServer and
     wait for either to complete.
     """
-    class ChildExited(Exception):
-        pass
-
-    def sigchld(frame, signum):
-        pid, status = os.wait()
-        raise ChildExited(pid, status)
-
-    signal.signal(signal.SIGCHLD, sigchld)
-
     use_proxy = True
     if use_proxy:
         peer_devname = '{}.dev'.format(__file__.rsplit('.', 1)[0])
@@ -651,17 +820,24 @@ def main():
         # socat -dd pty,rawer,link=server.dev pty,rawer,link=client.dev
         devname = './server.dev'
 
+    # Watch the child through a pidfd in the server poll loop, instead of
+    # a SIGCHLD handler that raises from whatever syscall it interrupts.
+    child_fd = None
+    if proxy_child and hasattr(os, 'pidfd_open'):
+        child_fd = os.pidfd_open(proxy_child)
+
     server = Iec6205621CServer(
         ExampleMe162DataProvider(), devname)
     try:
         # No asyncio for the serial.Serial() stuff. It has trouble
         # playing nicely with our opentty using SerialProxy.
         # > tcsetattr: termios.error: (22, 'Invalid argument')
-        server.serve()
-    except ChildExited as e:
-        print(f'Child exited with status {e.args[1]}')
-        assert e.args[0] == proxy_child, e.args
-        proxy_child = None
+        server.serve(watch_fd=child_fd)
+        if proxy_child:
+            pid, status = os.waitpid(proxy_child, os.WNOHANG)
+            if pid:
+                print(f'Child exited with status {status}')
+                proxy_child = None
     except KeyboardInterrupt:
         print('Got SIGINT')
     finally:
@@ -671,8 +847,10 @@ def main():
 
         print('Stopping server...')
         server.close()
+        if child_fd is not None:
+            os.close(child_fd)
 
 
 if __name__ == '__main__':
-    assert append_bcc(f'{SOH}B0{ETX}') == b'\x01B0\x03q'
+    assert BREAK_FRAME == b'\x01B0\x03q'
     main()
@@ -13,7 +13,13 @@ Example:
 
 XXX: alleen voor Me162 subclass voor de F.F de Me162.. de rest gewone obis?
 """
+import re
+
 from decimal import Decimal
+from functools import lru_cache
+
+OBIS_CODE_RE = re.compile(
+    r'(\d+|[A-Z])\.(\d+|[A-Z])\.(\d+)(?:\*(\d+))?\Z')
 
 
 class DecimalWithUnit(Decimal):
@@ -23,9 +29,11 @@ class DecimalWithUnit(Decimal):
         ret.unit = unit
         return ret
 
-    def __str__(self, format_spec=''):
-        return '{} {}'.format(super().__str__(), self.unit)
-    __format__ = __str__
+    def __str__(self):
+        return f'{Decimal.__str__(self)} {self.unit}'
+
+    def __format__(self, format_spec):
+        return f'{Decimal.__format__(self, format_spec)} {self.unit}'
 
 
 class ElectricityObis:
@@ -67,40 +75,19 @@ class ElectricityObis:
         obis = ElectricityObis.from_code('1.8.0')
         obis.set_value(33402.264, 'kWh')
     """
+    __slots__ = ('c', 'd', 'e', 'f', '_value', '_cached_value', 'description')
+
     unit = NotImplemented
 
     @classmethod
     def from_code(cls, code):
-        try:
-            if code == 'F.F':
-                code = 'F.F.0'  # "F.F" on ISKRA ME162
-            c, d, e = code.split('.')
-            c = int(c) if c.isdigit() else c
-            d = int(d) if d.isdigit() else d
-            f = None
-            if '*' in e:
-                e, f = e.split('*')
-                e = int(e)
-                f = int(f)
-            else:
-                e = int(e)
-        except ValueError:
-            raise NotImplementedError(f'cannot parse code {code!r}')
-
-        # 1.8.0, 15.8.0, ...
-        if c in (1, 2, 15, 16) and d == 8:
-            return ActiveEnergyElectricityObis(c, d, e, f)
-        # 1.7.0, 15.7.0, ...
-        elif c in (1, 2, 15, 16) and d == 7:
-            return InstantaneousPowerElectricityObis(c, d, e, f)
-        # C.1.0, 0.0.0, 0.9.1
-        elif f is None and (c == 0 or code == 'C.1.0' or code == 'F.F.0'):
-            return MiscObis(c, d, e, f)
-        raise NotImplementedError(f'unknown/unhandled code {code!r}')
+        obis_cls, c, d, e, f = _parse_code(code)
+        return obis_cls(c, d, e, f)
 
     def __init__(self, c, d, e, f):
         self.c, self.d, self.e, self.f = c, d, e, f
         self._value = 0
+        self._cached_value = None
 
     @property
     def code(self):
@@ -112,7 +99,16 @@ class ElectricityObis:
     def value(self):
         if self.unit is NotImplemented:
             return self._value
-        return DecimalWithUnit.with_unit(self._value, self.unit)
+        # Build the DecimalWithUnit once per set_value().
+        if self._cached_value is None:
+            self._cached_value = DecimalWithUnit.with_unit(
+                self._value, self.unit)
+        return self._cached_value
+
+    @property
+    def raw_value(self):
+        "Return the value without the unit (an int after a kW/kWh scale)"
+        return self._value
 
     def set_value(self, value, unit=None):
         if unit is None:
@@ -125,6 +121,7 @@ class ElectricityObis:
         else:
             raise NotImplementedError(f'unhandled unit {unit!r}')
         self._value = value
+        self._cached_value = None
         return self
 
     def __repr__(self):
@@ -132,33 +129,41 @@ class ElectricityObis:
 
 
 class ActiveEnergyElectricityObis(ElectricityObis):
+    __slots__ = ()
+
     unit = 'Wh'
 
+    _DESCRIPTIONS = {
+        1: 'Positive active energy (A+) {parts}',  # 1.8.x
+        2: 'Negative active energy (A-) {parts}',  # 2.8.x
+        15: 'Absolute active energy (A+) {parts} (=A+ - A-)',  # 15.8.x
+        16: ('Sum active energy without reverse blockade {parts} '
+             '(=A+ - A-)'),    # 16.8.x
+    }
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         assert self.d == 8, self.code
         parts = f'in T{self.e}' if self.e else 'total'
-        self.description = {
-            1: f'Positive active energy (A+) {parts}',  # 1.8.x
-            2: f'Negative active energy (A-) {parts}',  # 2.8.x
-            15: f'Absolute active energy (A+) {parts} (=A+ - A-)',  # 15.8.x
-            16: (f'Sum active energy without reverse blockade {parts} '
-                 f'(=A+ - A-)'),    # 16.8.x
-        }[self.c]
+        self.description = self._DESCRIPTIONS[self.c].format(parts=parts)
 
 
 class InstantaneousPowerElectricityObis(ElectricityObis):
+    __slots__ = ()
+
     unit = 'W'
 
+    _DESCRIPTIONS = {
+        1: 'Positive active instantaneous power (A+)',      # 1.7.0
+        2: 'Negative active instantaneous power (A-)',      # 2.7.0
+        15: 'Absolute active instantaneous power (|A|)',    # 15.7.0
+        16: 'Sum active instantaneous power (A+ - A-)',     # 16.7.0
+    }
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         assert self.d == 7 and self.e == 0, self.code
-        self.description = {
-            1: 'Positive active instantaneous power (A+)',      # 1.7.0
-            2: 'Negative active instantaneous power (A-)',      # 2.7.0
-            15: 'Absolute active instantaneous power (|A|)',    # 15.7.0
-            16: 'Sum active instantaneous power (A+ - A-)',     # 16.7.0
-        }[self.c]
+        self.description = self._DESCRIPTIONS[self.c]
 
 
 class MiscObis(ElectricityObis):
@@ -189,4 +194,38 @@ class MiscObis(ElectricityObis):
     > 7   Not implemented
     > (We expect this to look like "000001F" if bits 0..4 are set.)
     """
-    pass
+    __slots__ = ()
+
+
+# Lookup of (C, D) to class, for ElectricityObis.from_code.
+_OBIS_CLASSES = {
+    **{(c, 8): ActiveEnergyElectricityObis for c in (1, 2, 15, 16)},
+    **{(c, 7): InstantaneousPowerElectricityObis for c in (1, 2, 15, 16)},
+}
+# Non-numeric codes that are MiscObis.
+_MISC_CODES = frozenset(('C.1.0', 'F.F.0'))
+
+
+@lru_cache(maxsize=128)
+def _parse_code(code):
+    "Return (class, c, d, e, f) for code; the set of codes is small"
+    if code == 'F.F':
+        code = 'F.F.0'  # "F.F" on ISKRA ME162
+    m = OBIS_CODE_RE.match(code)
+    if not m:
+        raise NotImplementedError(f'cannot parse code {code!r}')
+    c, d, e, f = m.groups()
+    c = int(c) if c.isdigit() else c
+    d = int(d) if d.isdigit() else d
+    e = int(e)
+    if f is not None:
+        f = int(f)
+
+    # 1.8.0, 15.8.0, 1.7.0, 15.7.0, ...
+    obis_cls = _OBIS_CLASSES.get((c, d))
+    if obis_cls is not None:
+        return obis_cls, c, d, e, f
+    # C.1.0, 0.0.0, 0.9.1
+    if f is None and (c == 0 or code in _MISC_CODES):
+        return MiscObis, c, d, e, f
+    raise NotImplementedError(f'unknown/unhandled code {code!r}')
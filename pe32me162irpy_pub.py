@@ -2,26 +2,26 @@
 import asyncio
 import logging
 import os
+import re
 import serial
 import serial_asyncio
 import sys
 import termios
 import time
 
-from collections import namedtuple
-from contextlib import AsyncExitStack
+from contextlib import AsyncExitStack, asynccontextmanager
 from decimal import Decimal
 from enum import Enum
 
 from asyncio_mqtt import Client as MqttClient, MqttError
 
 try:
-    from .ctrlcode import ACK, CR, EOT, ETX, LF, NAK, SOH, STX
+    from .ctrlcode import ACK_B, EOT, ETX, ETX_B, NAK, SOH_B, STX_B
     from .din66219 import append_bcc, check_bcc
     from .obis import DecimalWithUnit, ElectricityObis
     from .wattgauge import EnergyGauge
 except ImportError:
-    from ctrlcode import ACK, CR, EOT, ETX, LF, NAK, SOH, STX
+    from ctrlcode import ACK_B, EOT, ETX, ETX_B, NAK, SOH_B, STX_B
     from din66219 import append_bcc, check_bcc
     from obis import DecimalWithUnit, ElectricityObis
     from wattgauge import EnergyGauge
@@ -30,39 +30,101 @@ __version__ = 'pe32me162irpy_pub-FIXME'
 
 log = logging.getLogger(__name__)
 
+# Seconds between the starts of two register polls. Frequent values
+# make for better WattGauge averages, so this is not tied to the
+# (much slower) publish interval.
+POLL_INTERVAL = 2.0
+
+# Stop after this many consecutive failed publishes (each of which is
+# already retried a few times).
+MAX_PUBLISH_FAILURES = 5
+
+# Fixed messages, built once.
+BREAK_MSG = SOH_B + b'B0' + ETX_B + b'q'
+REQUEST_MSG = b'/?!\r\n'
+ACK_DATA_MODE_MSG = ACK_B + b'050\r\n'
+ACK_PROG_MODE_MSG = ACK_B + b'051\r\n'
+CRLF = b'\r\n'
+IDENT_MSG = b'/ISK5ME162-0033\r\n'
+PROG_MODE_MSG = append_bcc(SOH_B + b'P0' + STX_B + b'()' + ETX_B)
+
+# The registers we poll in programming mode, with their (never
+# changing) R1 request frames.
+OBIS_REQUESTS = tuple(
+    (address, append_bcc(
+        SOH_B + b'R1' + STX_B + address.encode('ascii') + b'()' + ETX_B))
+    for address in ('1.8.0', '2.8.0'))
+
+# dataset CR LF, for all datasets in a readout datablock.
+DATASET_LINE_RE = re.compile(
+    rb'(?P<address>[^()/!\r\n]*)\((?P<value>[^()/!*\r\n]*)'
+    rb'(?:\*(?P<unit>[^()/!\r\n]*))?\)\r\n')
+
 
 def parse_iec6205621_dataset(dataset):
     # dataset ::= address? "(" value? ( "*" unit )? ")"
-    try:
-        address, rest = dataset.split('(', 1)
-        if not rest.endswith(')'):
-            raise ValueError
-    except ValueError:
+    address, sep, rest = dataset.partition(b'(')
+    if not sep or not rest.endswith(b')'):
         raise ValueError(f'error parsing dataset {dataset!r}')
-    return (address,) + parse_iec6205621_value(rest[0:-1])
+    return (address.decode('ascii'),) + parse_iec6205621_value(rest[0:-1])
 
 
 def parse_iec6205621_value(value):
     # address ::= (max 16 chars, except for "()/!")
     # value ::= (max 128 chars, except for "()/!*"; decimals use 1 period)
     # unit ::= (max 16 chars , except for "()/!")
-    if '*' in value:
+    value, sep, unit = value.partition(b'*')
+    if sep:
         # For values with units, we'll assume they're in single-period
         # decimal.
-        value, unit = value.split('*', 1)
-        value = Decimal(value)
-    else:
-        # For unit-less values, we do not make assumptions about the
-        # data type (int, decimal, hex?).
-        unit = None
-    return value, unit
+        return Decimal(value.decode('ascii')), unit.decode('ascii')
+    # For unit-less values, we do not make assumptions about the
+    # data type (int, decimal, hex?).
+    return value.decode('ascii'), None
+
+
+def iter_iec6205621_datablock(datablock):
+    """
+    Yield (address, value, unit) for every dataset line in datablock
+
+    The datablock is the readout without the trailing "!" CR LF. The
+    value/unit conversion is the same as for parse_iec6205621_dataset.
+    """
+    pos = 0
+    for m in DATASET_LINE_RE.finditer(datablock):
+        if m.start() != pos:
+            break
+        pos = m.end()
+        address, value, unit = m.groups()
+        if unit is None:
+            value = value.decode('ascii')
+        else:
+            value = Decimal(value.decode('ascii'))
+            unit = unit.decode('ascii')
+        yield address.decode('ascii'), value, unit
+    if pos != len(datablock):
+        raise ValueError(f'error parsing datablock at {datablock[pos:]!r}')
+
+
+def _find_etx_eot(buf, start=0):
+    "Return the position of the first ETX or EOT in buf, or -1"
+    etx = buf.find(ETX, start)
+    eot = buf.find(EOT, start, (etx if etx != -1 else len(buf)))
+    return eot if eot != -1 else etx
 
 
 def unpack_iec6205621_datamessage(buf):
     # datamessage ::= STX datablock "!" CR LF ETX bcc  (readout mode)
     # datamessage ::= STX dataset ETX bcc  (programming mode)
-    check_bcc(buf)  # raises ValueError on failure
-    return buf[1:-2].decode('ascii')  # remove {STX}...{ETX}{$BCC}
+    check_bcc(buf)
+    return _strip_datamessage_framing(buf)
+
+
+def _strip_datamessage_framing(buf):
+    "Remove {STX}...{ETX}{$BCC} from a datamessage checked by check_bcc"
+    # Only for buffers from recv_datamessage(), which already checked
+    # the BCC. The bytes are decoded per field.
+    return bytes(memoryview(buf)[1:-2])
 
 
 class Pe32Me162Publisher:
@@ -72,51 +134,84 @@ class Pe32Me162Publisher:
         self._mqtt_topic = os.environ.get(
             'PE32ME162_TOPIC', 'myhome/infra/power/xwwwform')
         self._mqttc = None
+        self._queue = None
+        self.writer_task = None
         self._guid = os.environ.get(
             'PE32ME162_GUID', 'EUI48:11:22:33:44:55:66')
+        # The fixed parts of every payload, encoded once.
+        self._payload_prefix = (
+            f'device_id={self._guid}&'
+            f'e_pos_act_energy_wh=').encode('ascii')
+        self._payload_suffix = f'&dbg_version={__version__}'.encode('ascii')
 
-    def open(self):
+    @asynccontextmanager
+    async def open(self):
         # Unfortunately this does use a thread for keepalives. Oh well.
         # As long as it's implemented correctly, I guess we can live
         # with it.
-        # FIXME: not sure.. but this is not fool proof. I wonder why/if
-        # we want to keep the contextmanager..
-        self._mqttc = MqttClient(self._mqtt_broker)
-        return self._mqttc
+        # Keepalive above the 120s publish interval: the connection is
+        # kept for the process lifetime and pings are not needed more
+        # often than that. A fixed client_id lets the broker replace a
+        # stale session of ours right away.
+        async with MqttClient(
+                self._mqtt_broker, keepalive=180,
+                client_id=self._guid) as mqttc:
+            self._mqttc = mqttc
+            # All publishes go through one writer task on this single
+            # connection, so they are sequential and errors are logged
+            # instead of lost in a fire-and-forget task.
+            self._queue = asyncio.Queue(maxsize=8)
+            self.writer_task = writer = asyncio.create_task(
+                self._writer_loop(), name='mqtt_writer')
+            try:
+                yield mqttc
+            finally:
+                self.writer_task = None
+                # If it is done already, main() has seen its result.
+                if not writer.done():
+                    writer.cancel()
+                    try:
+                        await writer
+                    except asyncio.CancelledError:
+                        pass
 
     def publish(self, pos_act, neg_act, inst_pwr):
-        # FIXME:
-        # 2022-01-24 23:10:58 Task exception was never retrieved
-        # future: <Task finished name='Task-4'
-        #   coro=<IskraMe162ValueProcessor.publish() done,
-        #   defined at ./iec62056_test_client.py:148> exception=ValueError()>
-        # Traceback (most recent call last):
-        #   File "./iec62056_test_client.py", line 152, in publish
-        #     raise ValueError('x')  # should be caught somewhere!!!
-        # ValueError: x
-        # FIXME: retrieve task here on next publish?? that should get us
-        # a nice exception then...
-        asyncio.create_task(self._publish(pos_act, neg_act, inst_pwr))
-
-    async def _publish(self, pos_act, neg_act, inst_pwr):
         log.debug(
-            f'_publish: 1.8.0 {pos_act}, 2.8.0 {neg_act}, '
-            f'16.7.0 {inst_pwr}')
+            'publish: 1.8.0 %s, 2.8.0 %s, 16.7.0 %s',
+            pos_act, neg_act, inst_pwr)
 
         tm = int(time.time())
-        mqtt_string = (
-            f'device_id={self._guid}&'
-            f'e_pos_act_energy_wh={int(pos_act)}&'
-            f'e_neg_act_energy_wh={int(neg_act)}&'
-            f'e_inst_power_w={int(inst_pwr)}&'
-            f'dbg_uptime={tm}&'
-            f'dbg_version={__version__}').encode('ascii')
-
-        await self._mqtt_publish(self._mqtt_topic, mqtt_string)
+        mqtt_string = b''.join((
+            self._payload_prefix,
+            b'%d&e_neg_act_energy_wh=%d&e_inst_power_w=%d&dbg_uptime=%d' % (
+                int(pos_act), int(neg_act), int(inst_pwr), tm),
+            self._payload_suffix))
+        description = (
+            f'1.8.0 {pos_act}, 2.8.0 {neg_act}, 16.7.0 {inst_pwr}')
 
-        log.info(
-            f'Published: 1.8.0 {pos_act}, 2.8.0 {neg_act}, '
-            f'16.7.0 {inst_pwr}')
+        try:
+            self._queue.put_nowait((mqtt_string, description))
+        except asyncio.QueueFull:
+            # The broker is not keeping up; drop the oldest value.
+            self._queue.get_nowait()
+            self._queue.put_nowait((mqtt_string, description))
+
+    async def _writer_loop(self):
+        failures = 0
+        while True:
+            mqtt_string, description = await self._queue.get()
+            try:
+                await self._mqtt_publish(self._mqtt_topic, mqtt_string)
+            except Exception:
+                log.exception('Publish failed: %s', description)
+                failures += 1
+                if failures >= MAX_PUBLISH_FAILURES:
+                    # Give up, so main() notices the broken broker
+                    # connection and we exit.
+                    raise
+            else:
+                log.info('Published: %s', description)
+                failures = 0
 
     async def _mqtt_publish(self, topic, payload):
         for i in (1, 2, 3):
@@ -129,6 +224,7 @@ class Pe32Me162Publisher:
                     await self._mqttc.disconnect()
                 except Exception:
                     log.exception('mqttc.disconnect()')
+                await asyncio.sleep(2)  # don't hammer a failing broker
                 await self._mqttc.connect()
             else:
                 break
@@ -138,10 +234,33 @@ class IskraMe162ValueProcessor:
     def __init__(self, publisher=None):
         self._publisher = publisher
         self._gauge = EnergyGauge()
-        self._last_sane_value = int(time.time() * 1000)  # start valid
+        # Milliseconds on the client's (event loop) clock, refreshed
+        # once per cycle through set_now_ms(). All times in here use
+        # that same clock.
+        self._now_ms = None
+        self._last_sane_value = None  # start valid, at first check
+        self._last_publish_ms = None
+        # One reusable ElectricityObis per polled register; set_register
+        # only updates its value.
+        self._obis_cache = {
+            address: ElectricityObis.from_code(address)
+            for address, frame in OBIS_REQUESTS}
+
+    def set_now_ms(self, now_ms):
+        """
+        Set the monotonic time (in ms) for the calls in this cycle
+        """
+        self._now_ms = now_ms
 
-    def ms_since_last_value(self):
-        return int(time.time() * 1000 - self._last_sane_value)
+    def ms_since_last_value(self, now_ms):
+        """
+        Return how long ago (in ms) the last sane value was set
+
+        now_ms must come from the same clock as set_now_ms().
+        """
+        if self._last_sane_value is None:
+            self._last_sane_value = now_ms
+        return now_ms - self._last_sane_value
 
     def should_stop(self):
         """
@@ -151,7 +270,7 @@ class IskraMe162ValueProcessor:
 
     def set_readout(self, text_readout):
         """
-        Accept textual readout, useful for debug purposes
+        Accept (ascii bytes) textual readout, useful for debug purposes
         """
         log.info('[text readout] %r', text_readout)
 
@@ -163,32 +282,35 @@ class IskraMe162ValueProcessor:
 
             set_register('1.8.0', Decimal('33402.264'), 'kWh')
         """
-        obis = ElectricityObis.from_code(address).set_value(value, unit)
-        current_ms = int(time.time() * 1000)
+        obis = self._obis_cache.get(address)
+        if obis is None:
+            obis = ElectricityObis.from_code(address)
+        obis.set_value(value, unit)
+        current_ms = self._now_ms
 
         log.info('set_register (at %s): %s', current_ms, obis)
 
+        # The gauge works on plain int Wh; the DecimalWithUnit is only
+        # created when publishing.
         if address == '1.8.0':
             self._gauge.set_positive_active_energy_total(
-                current_ms, obis.value)
+                current_ms, int(obis.raw_value))
             self._last_sane_value = current_ms
         elif address == '2.8.0':
             self._gauge.set_negative_active_energy_total(
-                current_ms, obis.value)
+                current_ms, int(obis.raw_value))
             self._last_sane_value = current_ms
 
     def is_time_to_publish(self):
         """
         Publish every 120s or more often when there are significant changes
         """
-        try:
-            self._last_publish
-        except AttributeError:
+        if self._last_publish_ms is None:
             # No last_publish, so we'll wait for the first significant
             # change.
             tdelta_s = 30
         else:
-            tdelta_s = int(time.time() - self._last_publish)
+            tdelta_s = (self._now_ms - self._last_publish_ms) // 1000
 
         inst_pwr = self._gauge.get_instantaneous_power()
         return (
@@ -203,23 +325,13 @@ class IskraMe162ValueProcessor:
         """
         Called after every run; allows us to quickly push changes
         """
-        if False:
-            log.debug(
-                'CURRENT: 1.8.0 - %s',
-                self._gauge.get_positive_active_energy_total())
-            log.debug(
-                'CURRENT: 2.8.0 - %s',
-                self._gauge.get_negative_active_energy_total())
-            log.debug(
-                'CURRENT: 16.7.0 - %s (has_change %s)',
-                self._gauge.get_instantaneous_power(),
-                self._gauge.has_significant_change())
-
         if self.is_time_to_publish():
-            pos_act = self._gauge.get_positive_active_energy_total()
-            neg_act = self._gauge.get_negative_active_energy_total()
-            inst_pwr = self._gauge.get_instantaneous_power()
-            inst_pwr = DecimalWithUnit.with_unit(inst_pwr, 'W')
+            pos_act = DecimalWithUnit.with_unit(
+                self._gauge.get_positive_active_energy_total(), 'Wh')
+            neg_act = DecimalWithUnit.with_unit(
+                self._gauge.get_negative_active_energy_total(), 'Wh')
+            inst_pwr = DecimalWithUnit.with_unit(
+                self._gauge.get_instantaneous_power(), 'W')
 
             assert isinstance(pos_act, DecimalWithUnit), (
                 type(pos_act), pos_act)
@@ -233,38 +345,37 @@ class IskraMe162ValueProcessor:
                 self._publisher.publish(pos_act, neg_act, inst_pwr)
             else:
                 log.info(
-                    f'Time to publish: 1.8.0 {pos_act}, 2.8.0 {neg_act}, '
-                    f'16.7.0 {inst_pwr}')
+                    'Time to publish: 1.8.0 %s, 2.8.0 %s, 16.7.0 %s',
+                    pos_act, neg_act, inst_pwr)
 
-            self._last_publish = time.time()
+            self._last_publish_ms = self._now_ms
             self._gauge.reset()
 
 
-Obis = namedtuple('Obis', 'code description')
-
-OBIS_MAP = dict((v.code, v) for v in (
+# OBIS code to description.
+OBIS_MAP = {
     # Administrative values:
 
     # We read these two in a loop for totals and to calculate
     # approximations for 1.7.0 and 2.7.0:
-    Obis('1.8.0', 'Positive active energy (A+) total [Wh]'),
-    Obis('2.8.0', 'Negative active energy (A+) total [Wh]'),
+    '1.8.0': 'Positive active energy (A+) total [Wh]',
+    '2.8.0': 'Negative active energy (A+) total [Wh]',
 
     # Available in ME-162, but not that useful to us:
-    Obis('1.8.1', 'Positive active energy (A+) in tariff T1 [Wh]'),
-    Obis('1.8.2', 'Positive active energy (A+) in tariff T2 [Wh]'),
-    Obis('1.8.3', 'Positive active energy (A+) in tariff T3 [Wh]'),
-    Obis('1.8.4', 'Positive active energy (A+) in tariff T4 [Wh]'),
-    Obis('2.8.1', 'Negative active energy (A+) in tariff T1 [Wh]'),
+    '1.8.1': 'Positive active energy (A+) in tariff T1 [Wh]',
+    '1.8.2': 'Positive active energy (A+) in tariff T2 [Wh]',
+    '1.8.3': 'Positive active energy (A+) in tariff T3 [Wh]',
+    '1.8.4': 'Positive active energy (A+) in tariff T4 [Wh]',
+    '2.8.1': 'Negative active energy (A+) in tariff T1 [Wh]',
     # ...
-    Obis('15.8.0', 'Total absolute active energy (= 1_8_0 + 2_8_0)')
+    '15.8.0': 'Total absolute active energy (= 1_8_0 + 2_8_0)',
 
     # Alas, not in ME-162 (returns (ERROR) when queried):
-    # Obis('1.7.0', 'Positive active instantaneous power (A+) [W]'),
-    # Obis('2.7.0', 'Negative active instantaneous power (A+) [W]'),
-    # Obis('16.7.0', 'Sum active instantaneous power [W] (=1_7_0-2_7_0)'),
-    # Obis('16.8.0', 'Sum of active energy without blockade (=1_8_0-2_8_0)'),
-))
+    # '1.7.0': 'Positive active instantaneous power (A+) [W]',
+    # '2.7.0': 'Negative active instantaneous power (A+) [W]',
+    # '16.7.0': 'Sum active instantaneous power [W] (=1_7_0-2_7_0)',
+    # '16.8.0': 'Sum of active energy without blockade (=1_8_0-2_8_0)',
+}
 
 
 class State:
@@ -286,22 +397,28 @@ class State:
         SLEEP = 254
         END = 255
 
+    READ_IOS = frozenset(io for io in IO if io.name.startswith('R_'))
+
     def __init__(self):
         self.mode = self.MODE.DATA_READOUT
         self.io = self.IO.W_BREAK
         self._obis_idx = 0
-        self._obis_requests = ['1.8.0', '2.8.0']
+        self._obis = OBIS_REQUESTS
+
+    @property
+    def obis_address(self):
+        return self._obis[self._obis_idx][0]
 
     @property
-    def obis_request(self):
-        return self._obis_requests[self._obis_idx]
+    def obis_frame(self):
+        return self._obis[self._obis_idx][1]
 
     def obis_has_next(self):
-        return bool(self._obis_idx + 1 < len(self._obis_requests))
+        return bool(self._obis_idx + 1 < len(self._obis))
 
     def obis_set_next(self):
         self._obis_idx += 1
-        assert self._obis_idx < len(self._obis_requests)
+        assert self._obis_idx < len(self._obis)
 
     def obis_reset(self):
         self._obis_idx = 0
@@ -310,38 +427,120 @@ class State:
         return '{}:{}'.format(self.mode.name, self.io.name)
 
 
+class SerialBufferProtocol(asyncio.Protocol):
+    """
+    Collect all received serial data in a single bytearray
+
+    The consumer cuts complete messages off the front of rxbuf and calls
+    wait_for_data() when it needs more.
+    """
+    def __init__(self):
+        self.transport = None
+        self.rxbuf = bytearray()
+        self._data_ready = asyncio.Event()
+        self._eof = False
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def data_received(self, data):
+        self.rxbuf += data
+        self._data_ready.set()
+
+    def connection_lost(self, exc):
+        self._eof = True
+        self._data_ready.set()
+
+    async def wait_for_data(self):
+        "Wait until more data is received; raise ConnectionError on EOF"
+        if not self._eof:
+            self._data_ready.clear()
+            await self._data_ready.wait()
+        if self._eof:
+            raise ConnectionError('peer closed serial')
+
+
 class Iec6205621CClient:
     def __init__(self, devname, processor):
         self._devname = devname
-        self._reader = self._writer = None
+        self._transport = self._proto = None
+        self._loop = None
         self._processor = processor
+        self._line_idle_since = 0.0  # loop time of last send/recv
+        self._poll_started_at = 0.0  # loop time of last W_REQ_OBIS start
+        self._recv_buf = bytearray()  # reused for every reply
+        self._software_bridge = False
+        # State.IO to handler; END is handled by loop() itself.
+        self._io_handlers = {
+            State.IO.W_BREAK: self._io_w_break,
+            State.IO.W_LOGIN: self._io_w_login,
+            State.IO.R_IDENT: self._io_r_ident,
+            State.IO.W_REQ_DATA_MODE: self._io_w_req_data_mode,
+            State.IO.R_DATA_READOUT: self._io_r_data_readout,
+            State.IO.W_REQ_PROG_MODE: self._io_w_req_prog_mode,
+            State.IO.R_ACK_PROG_MODE: self._io_r_ack_prog_mode,
+            State.IO.W_REQ_OBIS: self._io_w_req_obis,
+            State.IO.R_READ_OBIS: self._io_r_read_obis,
+            State.IO.TRY_PUBLISH: self._io_try_publish,
+            State.IO.SLEEP: self._io_sleep,
+        }
 
     async def open(self):
+        self._loop = asyncio.get_running_loop()
         try:
             # Hardware UART should cope with bytesize=7 and parity.
             # Start with 9600 baud because our peer might still be in the
             # upgraded state.
-            reader, writer = await serial_asyncio.open_serial_connection(
+            transport, proto = await serial_asyncio.create_serial_connection(
+                self._loop, SerialBufferProtocol,
                 url=self._devname, baudrate=9600, bytesize=7,
                 parity=serial.PARITY_EVEN, stopbits=1, exclusive=True)
         except termios.error:
             # Software openpty bridge does not copy with bytesize=7 and
             # parity.
             log.info('Detected non-UART (connected to software serial bridge)')
-            reader, writer = await serial_asyncio.open_serial_connection(
+            self._software_bridge = True
+            transport, proto = await serial_asyncio.create_serial_connection(
+                self._loop, SerialBufferProtocol,
                 url=self._devname, baudrate=9600, bytesize=8,
                 parity=serial.PARITY_NONE, stopbits=1)
 
-        self._reader = reader
-        self._writer = writer
+        try:
+            # On USB serial adapters (FTDI and friends), this sets
+            # ASYNC_LOW_LATENCY, so received bytes are passed on right
+            # away instead of after the (16ms) latency timer.
+            transport.serial.set_low_latency_mode(True)
+        except (AttributeError, NotImplementedError, ValueError):
+            pass  # not Linux, or not a (USB) UART
+        self._set_latency_timer(1)
+
+        self._transport = transport
+        self._proto = proto
+
+    def _set_latency_timer(self, ms):
+        """
+        Set the USB serial (FTDI) latency timer, if the device has one
+
+        Not all kernels lower it for ASYNC_LOW_LATENCY, and it defaults
+        to 16ms, which adds up on every reply. Writing it needs
+        permissions on sysfs, so failure is only logged.
+        """
+        ttyname = os.path.basename(os.path.realpath(self._devname))
+        path = f'/sys/bus/usb-serial/devices/{ttyname}/latency_timer'
+        if not os.path.exists(path):
+            return  # not a USB serial adapter
+        try:
+            with open(path, 'w') as fp:
+                fp.write(f'{ms}\n')
+        except OSError as e:
+            log.warning('Could not set %s to %d: %s', path, ms, e)
 
     def close(self):
         log.debug('(Iec6205621CClient.close)')
         # close() to signal to the other side that we're done/gone. Useful
         # for software/PTY bridge.
-        self._writer.close()
-        # self._reader has no close()
-        self._writer = self._reader = None
+        self._transport.close()
+        self._transport = self._proto = None
 
     async def run(self):
         state = State()
@@ -349,43 +548,94 @@ class Iec6205621CClient:
             pass
 
     async def send(self, msg, state):
-        log.debug(f'{state}: sleep 0.020 (pre-send)')
-        await asyncio.sleep(0.02)
-
-        if not isinstance(msg, (bytes, bytearray)):
-            msg = msg.encode('ascii')
-        log.debug(f'{state}: send {bytes(msg)}')
-        self._writer.write(msg)  # actually synchronous!
-
-        # Sleep a short while. This is useful when testing against the
-        # SerialProxy. The drain functions otherwise don't appear to act
-        # fast enough.
-        sleep_time = (
-            # 10 bits per byte, divided by baud rate.
-            len(msg) * 10.0 / self._writer.transport._serial.baudrate)
-        log.debug(f'{state}: sleep {sleep_time:.3}')
-        await asyncio.sleep(sleep_time)
+        # Keep 20ms between the last line activity and this send. Time
+        # spent processing the previous reply counts towards that.
+        delay = self._line_idle_since + 0.02 - self._loop.time()
+        if delay > 0:
+            log.debug('%s: sleep %.3g (pre-send)', state, delay)
+            await asyncio.sleep(delay)
+
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug('%s: send %r', state, msg)
+        self._transport.write(msg)  # actually synchronous!
+
+        if self._software_bridge:
+            # Sleep a short while. This is useful when testing against
+            # the SerialProxy. The drain functions otherwise don't
+            # appear to act fast enough.
+            sleep_time = (
+                # 10 bits per byte, divided by baud rate.
+                len(msg) * 10.0 / self._transport.serial.baudrate)
+            log.debug('%s: sleep %.3g', state, sleep_time)
+            await asyncio.sleep(sleep_time)
+        else:
+            # On a real UART, flush() does a tcdrain(), which returns as
+            # soon as the last byte is out. That must happen before any
+            # baudrate change. It blocks, so keep it off the event loop.
+            try:
+                await asyncio.wait_for(self._loop.run_in_executor(
+                    None, self._transport.serial.flush), timeout=10)
+            except asyncio.TimeoutError:
+                # The UART does not get its bytes out. Discard them, so
+                # the executor thread leaves tcdrain(), and give up:
+                # this is what the dead mans switch is for.
+                self._transport.serial.reset_output_buffer()
+                raise DeadMansSwitchTripped(
+                    f'{state}: output not drained after 10 seconds')
+        self._line_idle_since = self._loop.time()
+
+    def _drop_rxbuf(self, buf):
+        "Move an incomplete reply to buf (for logging) and forget it"
+        buf += self._proto.rxbuf
+        self._proto.rxbuf.clear()
+
+    def _take_rxbuf(self, buf, size):
+        "Move the first size bytes of the received data to buf"
+        rxbuf = self._proto.rxbuf
+        buf += memoryview(rxbuf)[:size]
+        del rxbuf[:size]
+        self._line_idle_since = self._loop.time()
 
     async def recv_text(self, buf, state):
         "Fill buf with text (delimited by CRLF)"
-        while buf[-2:] != b'\r\n':
-            msg = await self._reader.read(1)
-            buf += msg
-        log.debug(f'{state}: recv {bytes(buf)}')
+        rxbuf = self._proto.rxbuf
+        start = 0
+        while True:
+            pos = rxbuf.find(CRLF, start)
+            if pos != -1:
+                break
+            # Only the last byte may be the start of a CRLF.
+            start = max(0, len(rxbuf) - 1)
+            await self._proto.wait_for_data()
+        self._take_rxbuf(buf, pos + 2)
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug('%s: recv %r', state, bytes(buf))
 
     async def recv_datamessage(self, buf, state):
         "Full buf with datamessage (ended by ETX/EOT + bcc), or empty on NAK"
-        byte = await self._reader.read(1)
-        log.debug(f'{state}: first byte')
-        if byte == NAK:
+        rxbuf = self._proto.rxbuf
+        if not rxbuf:
+            await self._proto.wait_for_data()
+        log.debug('%s: first bytes', state)
+        if rxbuf[0] == NAK:
+            del rxbuf[:1]
+            self._line_idle_since = self._loop.time()
             return  # keep buf empty
 
-        buf += byte
-        while buf[-2:-1] not in (ETX, EOT):
-            byte = await self._reader.read(1)
-            buf += byte
+        # The first ETX/EOT ends the message; the BCC byte after it can
+        # have any value, including ETX/EOT.
+        start = 0
+        while True:
+            end = _find_etx_eot(rxbuf, start)
+            if end == -1:
+                start = len(rxbuf)
+            elif end + 1 < len(rxbuf):
+                break
+            await self._proto.wait_for_data()
+        self._take_rxbuf(buf, end + 2)
 
-        log.debug(f'{state}: recv {bytes(buf)}')
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug('%s: recv %r', state, bytes(buf))
         # Buf should now hold data including checksum.
         try:
             check_bcc(buf)
@@ -400,17 +650,29 @@ class Iec6205621CClient:
     async def loop(self, state):
         "Does a recv/send cycle (if applicable)"
 
-        # Read/fill buffer. This does not need any timeout because we
-        # have a dead mans switch.
-        if state.io.name.startswith('R_'):
-            buf = bytearray()
+        # Dead mans switch: every receive has a timeout and the sleep
+        # is short, so we get back here at least every 10 seconds, also
+        # when the meter stops answering. (A stuck flush in send()
+        # trips the switch itself.)
+        tdelta = self._processor.ms_since_last_value(
+            int(self._loop.time() * 1000))
+        if tdelta >= 50000:
+            raise DeadMansSwitchTripped(
+                f'more than {tdelta} ms have passed without changes')
+
+        # Read/fill buffer.
+        buf = None
+        if state.io in State.READ_IOS:
+            buf = self._recv_buf
+            buf.clear()
             if state.io == State.IO.R_IDENT:
                 try:
                     await asyncio.wait_for(
                         self.recv_text(buf, state), timeout=5)
                 except asyncio.TimeoutError:
+                    self._drop_rxbuf(buf)
                     log.error(
-                        f'{state}: timeout in recv_text: {bytes(buf)}')
+                        '%s: timeout in recv_text: %r', state, bytes(buf))
                     state.io = State.IO.W_LOGIN
                 else:
                     assert buf[-2:] == b'\r\n', buf
@@ -419,121 +681,122 @@ class Iec6205621CClient:
                     await asyncio.wait_for(
                         self.recv_datamessage(buf, state), timeout=10)
                 except asyncio.TimeoutError:
+                    self._drop_rxbuf(buf)
                     log.error(
-                        f'{state}: timeout in recv_datamessage: {bytes(buf)}')
+                        '%s: timeout in recv_datamessage: %r',
+                        state, bytes(buf))
                     state.io = State.IO.W_REQ_OBIS
                 else:
                     if not buf:
-                        log.error(f'{state}: got NAK, back to W_REQ_OBIS')
+                        log.error('%s: got NAK, back to W_REQ_OBIS', state)
                         state.io = State.IO.W_REQ_OBIS
 
-        # Act upon state and buffer.
-        if state.io == State.IO.W_BREAK:
-            await self.send(f'{SOH}B0{ETX}q', state)
-            self._writer.transport._serial.baudrate = 300
-            state.io = State.IO.W_LOGIN
-
-        elif state.io == State.IO.W_LOGIN:
-            await self.send(f'/?!{CR}{LF}', state)
-            state.io = State.IO.R_IDENT
-
-        elif state.io == State.IO.R_IDENT:
-            assert buf == b'/ISK5ME162-0033\r\n', buf
-            if state.mode == State.MODE.DATA_READOUT:
-                state.io = State.IO.W_REQ_DATA_MODE
-            elif state.mode == State.MODE.PROGRAMMING_MODE:
-                state.io = State.IO.W_REQ_PROG_MODE
-            else:
-                raise NotImplementedError(state)
-
-        elif state.io == State.IO.W_REQ_DATA_MODE:
-            await self.send(f'{ACK}050{CR}{LF}', state)
-            self._writer.transport._serial.baudrate = 9600
-            state.io = State.IO.R_DATA_READOUT
-
-        elif state.io == State.IO.R_DATA_READOUT:
-            datamessage = unpack_iec6205621_datamessage(buf)
-            self._processor.set_readout(datamessage)
-
-            # Don't just set the readout. Also fill all registers with the
-            # values we got from the full readout.
-            assert datamessage.endswith('\r\n!\r\n')
-            for part in datamessage[0:-5].split('\r\n'):
-                address, value, unit = parse_iec6205621_dataset(part)
-                self._processor.set_register(address, value, unit)
-
-            state.mode = State.MODE.PROGRAMMING_MODE
-            state.io = State.IO.W_BREAK
-
-        elif state.io == State.IO.W_REQ_PROG_MODE:
-            await self.send(f'{ACK}051{CR}{LF}', state)
-            self._writer.transport._serial.baudrate = 9600
-            state.io = State.IO.R_ACK_PROG_MODE
-
-        elif state.io == State.IO.R_ACK_PROG_MODE:
-            assert buf == append_bcc(f'{SOH}P0{STX}(){ETX}'), buf
-            state.io = State.IO.W_REQ_OBIS
-
-        elif state.io == State.IO.W_REQ_OBIS:
-            await self.send(
-                append_bcc(f'{SOH}R1{STX}{state.obis_request}(){ETX}'), state)
-            state.io = State.IO.R_READ_OBIS
-
-        elif state.io == State.IO.R_READ_OBIS:
-            dataset = unpack_iec6205621_datamessage(buf)
-            address, value, unit = parse_iec6205621_dataset(dataset)
-            assert address == '', dataset
-            self._processor.set_register(state.obis_request, value, unit)
-            if state.obis_has_next():
-                state.obis_set_next()
-                state.io = State.IO.W_REQ_OBIS
-            else:
-                state.io = State.IO.TRY_PUBLISH
-
-        elif state.io == State.IO.TRY_PUBLISH:
-            self._processor.try_publish()
+        # Act upon state and buffer. The loop time is cached, so this
+        # is cheap, and it is the same for all registers in a readout.
+        self._processor.set_now_ms(int(self._loop.time() * 1000))
+        if state.io == State.IO.END:
+            return False
+        try:
+            handler = self._io_handlers[state.io]
+        except KeyError:
+            raise NotImplementedError(state)
+        await handler(state, buf)
+        return True
 
-            if self._processor.should_stop():
-                state.io = State.IO.END
-            else:
-                state.io = State.IO.SLEEP
+    async def _io_w_break(self, state, buf):
+        await self.send(BREAK_MSG, state)
+        self._transport.serial.baudrate = 300
+        state.io = State.IO.W_LOGIN
+
+    async def _io_w_login(self, state, buf):
+        await self.send(REQUEST_MSG, state)
+        state.io = State.IO.R_IDENT
+
+    async def _io_r_ident(self, state, buf):
+        assert buf == IDENT_MSG, buf
+        if state.mode == State.MODE.DATA_READOUT:
+            state.io = State.IO.W_REQ_DATA_MODE
+        elif state.mode == State.MODE.PROGRAMMING_MODE:
+            state.io = State.IO.W_REQ_PROG_MODE
+        else:
+            raise NotImplementedError(state)
 
-        elif state.io == State.IO.SLEEP:
-            await asyncio.sleep(2)
+    async def _io_w_req_data_mode(self, state, buf):
+        await self.send(ACK_DATA_MODE_MSG, state)
+        self._transport.serial.baudrate = 9600
+        state.io = State.IO.R_DATA_READOUT
+
+    async def _io_r_data_readout(self, state, buf):
+        datamessage = _strip_datamessage_framing(buf)
+        self._processor.set_readout(datamessage)
+
+        # Don't just set the readout. Also fill all registers with the
+        # values we got from the full readout.
+        assert datamessage.endswith(b'\r\n!\r\n')
+        for address, value, unit in iter_iec6205621_datablock(
+                datamessage[0:-3]):
+            self._processor.set_register(address, value, unit)
+
+        state.mode = State.MODE.PROGRAMMING_MODE
+        state.io = State.IO.W_BREAK
+
+    async def _io_w_req_prog_mode(self, state, buf):
+        await self.send(ACK_PROG_MODE_MSG, state)
+        self._transport.serial.baudrate = 9600
+        state.io = State.IO.R_ACK_PROG_MODE
+
+    async def _io_r_ack_prog_mode(self, state, buf):
+        assert buf == PROG_MODE_MSG, buf
+        self._poll_started_at = self._loop.time()
+        state.io = State.IO.W_REQ_OBIS
+
+    async def _io_w_req_obis(self, state, buf):
+        await self.send(state.obis_frame, state)
+        state.io = State.IO.R_READ_OBIS
+
+    async def _io_r_read_obis(self, state, buf):
+        dataset = _strip_datamessage_framing(buf)
+        address, value, unit = parse_iec6205621_dataset(dataset)
+        assert address == '', dataset
+        self._processor.set_register(state.obis_address, value, unit)
+        if state.obis_has_next():
+            state.obis_set_next()
             state.io = State.IO.W_REQ_OBIS
-            state.obis_reset()
+        else:
+            state.io = State.IO.TRY_PUBLISH
 
-        elif state.io == State.IO.END:
-            return False
+    async def _io_try_publish(self, state, buf):
+        self._processor.try_publish()
 
+        if self._processor.should_stop():
+            state.io = State.IO.END
         else:
-            raise NotImplementedError(state)
+            state.io = State.IO.SLEEP
 
-        return True
+    async def _io_sleep(self, state, buf):
+        # Start a poll every POLL_INTERVAL seconds, counting the time
+        # the previous poll took, so the gauge gets evenly spaced values.
+        delay = self._poll_started_at + POLL_INTERVAL - self._loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        self._poll_started_at = self._loop.time()
+        state.io = State.IO.W_REQ_OBIS
+        state.obis_reset()
 
 
 class DeadMansSwitchTripped(Exception):
     pass
 
 
-async def dead_mans_switch(processor):
-    while True:
-        tdelta = processor.ms_since_last_value()
-        if tdelta >= 50000:
-            raise DeadMansSwitchTripped(
-                f'more than {tdelta} ms have passed without changes')
-        await asyncio.sleep(1)
-
-
 async def main(serial_dev, publisher_class=Pe32Me162Publisher):
     async def cancel_tasks(tasks):
-        log.debug(f'Checking tasks {tasks!r}')
+        log.debug('Checking tasks %r', tasks)
         for task in tasks:
             if task.done():
-                log.debug(f'- task {task} was already done')
+                log.debug('- task %s was already done', task)
                 continue
             try:
-                log.debug(f'- task {task} to be cancelled')
+                log.debug('- task %s to be cancelled', task)
                 task.cancel()
                 await task
             except asyncio.CancelledError:
@@ -556,13 +819,14 @@ async def main(serial_dev, publisher_class=Pe32Me162Publisher):
         await iec62056_client.open()
         stack.callback(iec62056_client.close)  # synchronous!
 
-        # Start our two tasks.
-        # XXX: do we need a publisher task here as well; one that can
-        # die if there is something permanently wrong with the mqtt?
+        # Start our task. The client loop also checks the dead mans
+        # switch. Watch the publisher writer task too: it ends after
+        # MAX_PUBLISH_FAILURES consecutive failed publishes, and that
+        # should stop us instead of going unnoticed.
         tasks.add(asyncio.create_task(
             iec62056_client.run(), name='iec62056_client'))
-        tasks.add(asyncio.create_task(
-            dead_mans_switch(processor), name='dead_mans_switch'))
+        if getattr(publisher, 'writer_task', None):
+            tasks.add(publisher.writer_task)
 
         # Execute tasks and handle exceptions.
         done, pending = await asyncio.wait(
@@ -592,7 +856,14 @@ if __name__ == '__main__':
         datefmt='%Y-%m-%d %H:%M:%S')
 
     print(f"pid {os.getpid()}: send SIGINT or SIGTERM to exit.")
-    loop = asyncio.get_event_loop()
+    try:
+        # Optional: a faster event loop, if installed.
+        import uvloop
+    except ImportError:
+        loop = asyncio.new_event_loop()
+    else:
+        loop = uvloop.new_event_loop()
+    asyncio.set_event_loop(loop)
     if sys.argv[1:2]:
         main_coro = main(sys.argv[1])  # '/dev/ttyAMA0' or '/dev/serial0'
     else:
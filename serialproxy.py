@@ -9,25 +9,28 @@ import select
 import sys
 import termios
 import time
-from collections import namedtuple
+from collections import deque
 from contextlib import suppress
 from warnings import warn
 
-
-tcattr = namedtuple('tcattr', 'iflag oflag cflag lflag ispeed ospeed cc')
-
 TCSPEED_TO_BAUDRATE = dict(
     # termios.B300: 300,
     # termios.B9600: 9600,
     (getattr(termios, i), int(i[1:]))
     for i in dir(termios) if i[0] == 'B' and i[1:].isdigit())
 
+# How much we read from a pty at once.
+READ_SIZE = 4096
+
 
 class HangupError(Exception):
     pass
 
 
 class SerialPty:
+    # Assume 1start, 7data, 1parity, 1stop
+    bits_per_byte = (1 + 7 + 1 + 1)
+
     def __init__(self):
         # > How can I detect when someone opens the slave side of a pty
         # > (pseudo-terminal) in Linux?
@@ -45,9 +48,12 @@ class SerialPty:
         self._ptsname = os.ttyname(self.worker_fd)  # do it before close!
         os.close(self.worker_fd)
 
+        self._speed = None  # termios speed code of _baudrate
         self._baudrate = None
-        self._writebuf = []
+        self._time_per_byte = None
+        self._writebuf = deque()
         self._writelast = 0
+        self._drain_task = None
 
         self._set_nonblock()
 
@@ -59,47 +65,54 @@ class SerialPty:
             assert self._baudrate is not None
         return self._baudrate
 
-    @property
-    def bits_per_byte(self):
-        "Assume 1start, 7data, 1parity, 1stop"
-        return (1 + 7 + 1 + 1)
-
     @property
     def time_per_byte(self):
         "How much time/delay we emulate for a single byte for this baudrate"
-        return (1.0 / self.baudrate * self.bits_per_byte)
+        if self._time_per_byte is None:
+            self._detect_baudrate()
+        return self._time_per_byte
 
     def _set_nonblock(self):
         "Set to non-blocking; standard for asyncio"
         flags = fcntl.fcntl(self.fd, fcntl.F_GETFL)
         fcntl.fcntl(self.fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
 
-    def read_byte(self):
-        "Read byte from fd directly"
+    def read_bytes(self):
+        "Read all available bytes (up to READ_SIZE) from fd directly"
         try:
-            byte = os.read(self.fd, 1)
+            data = os.read(self.fd, READ_SIZE)
         except OSError as e:
             if e.args[0] == 5:  # EIO
                 raise HangupError()
             elif e.args[0] == 11:  # EAGAIN/EWOULDBLOCK
-                pass
+                return b''
             else:
                 raise
 
-        assert len(byte) == 1, byte
         self._detect_baudrate()  # update detected baud on read
-        return byte
-
-    def write_byte(self, byte, baudrate):
-        "Schedule byte to be written as fast as baudrate permits"
-        assert len(byte) == 1, byte
-        self._writebuf.append((byte, baudrate))
-
-        # Schedule a single byte to be written _only_ if this is the
-        # first in the queue. In other cases the latest write will
-        # schedule a new one.
-        if len(self._writebuf) == 1:
-            self._schedule_write_after_baudrate_delay()
+        return data
+
+    def write_bytes(self, data, baudrate):
+        "Schedule bytes to be written as fast as baudrate permits"
+        if not self._writebuf:
+            # Idle time gives no credit: the first byte is due now, the
+            # rest at the baudrate, even if the line was quiet for long.
+            self._writelast = max(
+                self._writelast, time.monotonic() - self.time_per_byte)
+        self._writebuf.extend((data[i:i + 1], baudrate)
+                              for i in range(len(data)))
+
+        # Start a drain task _only_ if none is running. A running one
+        # will pick up the new bytes.
+        if self._writebuf and (
+                self._drain_task is None or self._drain_task.done()):
+            # If the line has been idle long enough, write the first
+            # byte right away instead of waiting for the task to start.
+            if time.monotonic() - self._writelast >= self.time_per_byte:
+                self._background_write()
+            if self._writebuf:
+                self._drain_task = asyncio.get_running_loop().create_task(
+                    self._drain())
 
     def close(self):
         "Clean up used fds"
@@ -112,45 +125,59 @@ class SerialPty:
     def _detect_baudrate(self):
         "Called on read and on write"
         # TODO: can we / do we want to detect more? CS7? etc..?
-        tc = tcattr(*termios.tcgetattr(self.fd))
-        assert tc.ispeed == tc.ospeed, tc
-        self._baudrate = TCSPEED_TO_BAUDRATE[tc.ispeed]
-
-    def _schedule_write_after_baudrate_delay(self):
-        "Schedule a write after baudrate delay"
-        loop = asyncio.get_running_loop()
-        tnext = self._writelast + self.time_per_byte
-        tdelay = tnext - time.time()
-        if tdelay <= 0:
-            loop.call_soon(self._background_write)
-        else:
-            # #loop.call_soon(self._writer, fd)
-            # #loop.call_at(tnext, self._writer, fd)
-            loop.call_later(tdelay, self._background_write)
+        # The other side changes the speed at will, so this cannot be
+        # cached. But we only need [iflag, oflag, cflag, lflag, ispeed,
+        # ospeed, cc][4:6], so skip wrapping it in a namedtuple.
+        ispeed, ospeed = termios.tcgetattr(self.fd)[4:6]
+        if ispeed == self._speed and ospeed == ispeed:
+            return  # unchanged
+
+        assert ispeed == ospeed, (ispeed, ospeed)
+        baudrate = TCSPEED_TO_BAUDRATE[ispeed]
+        self._speed = ispeed
+        self._baudrate = baudrate
+        self._time_per_byte = 1.0 / baudrate * self.bits_per_byte
+
+    async def _drain(self):
+        "Write out the queued bytes, waiting the baudrate delay for each"
+        while self._writebuf:
+            tdelay = self._writelast + self.time_per_byte - time.monotonic()
+            if tdelay > 0:
+                await asyncio.sleep(tdelay)
+            self._background_write()
 
     def _background_write(self):
         "The actual write after the baudrate delay"
         assert self._writebuf, self
 
         self._detect_baudrate()  # update detected baud on write
-        byte, peer_baudrate = self._writebuf.pop(0)
+        time_per_byte = self._time_per_byte
+
+        # Write all bytes that are due in one go: that is one byte
+        # normally, but more if we woke up late. (write_bytes() makes
+        # sure idle time is not counted.)
+        count = min(
+            len(self._writebuf),
+            max(1, int((time.monotonic() - self._writelast) /
+                       time_per_byte)))
+        items = [self._writebuf.popleft() for _ in range(count)]
+        data = b''.join(byte for byte, peer_baudrate in items)
 
         # Compare baudrate with expected baudrate.
-        if peer_baudrate != self.baudrate:
+        peer_baudrates = set(
+            peer_baudrate for byte, peer_baudrate in items)
+        if peer_baudrates != {self._baudrate}:
             # This is NOT always a problem. It might be if there are
             # many of these though.. (There's a slight going on when
             # (re)setting the baud rate.)
             print('(baudrate mismatch, forwarding {!r} from {} to {})'.format(
-                byte, peer_baudrate, self.baudrate))
+                data, '/'.join(map(str, sorted(peer_baudrates))),
+                self.baudrate))
 
         # An EWOULDBLOCK/EAGAIN or any other error is unexpected here.
-        count = os.write(self.fd, byte)
-        assert count == 1, count
-        self._writelast = time.time()
-
-        # Schedule next write in a timely manner.
-        if self._writebuf:
-            self._schedule_write_after_baudrate_delay()
+        written = os.write(self.fd, data)
+        assert written == count, (written, count)
+        self._writelast += count * time_per_byte
 
     def __repr__(self):
         buflen = len(self._writebuf)
@@ -187,26 +214,33 @@ class SerialProxy:
         """
         Poll the closed worker_fd for POLLHUP; they will un-HUP once
         they're connected. Then we add the readers. And shutdown once
-        one side HUPs again.
+        one side HUPs again: for that we let the loop watch the epoll
+        fd, so there is no periodic wakeup while connected.
 
         TODO: Maybe allow reconnecting..
         """
         def hup_count(evs):
             hups = 0
             for fd, ev in evs:
-                assert not (ev & (select.POLLERR | select.POLLNVAL)), evs
-                if ev & select.POLLHUP:
+                assert not (ev & select.EPOLLERR), evs
+                if ev & select.EPOLLHUP:
                     hups += 1
             return hups
 
-        # Add the two (disconnected) slave FDs to the poller.
-        poller = select.poll()
+        # Add the two (disconnected) slave FDs to the poller. Only
+        # listen for HUP/ERR (always reported), not for data.
+        poller = select.epoll()
         for pty in (self._pty1, self._pty2):
-            poller.register(pty.worker_fd, (
-                select.POLLIN | select.POLLHUP | select.POLLERR |
-                select.POLLNVAL))
+            poller.register(pty.worker_fd, select.EPOLLHUP)
 
-        # Is any fd still in hangup (HUP) state?
+        try:
+            await self._wait_for_hup_state(poller, hup_count)
+        finally:
+            poller.close()
+
+    async def _wait_for_hup_state(self, poller, hup_count):
+        # Is any fd still in hangup (HUP) state? Going out of HUP
+        # state yields no event, so this part has to poll.
         while hup_count(poller.poll(0)) != 0:
             await asyncio.sleep(0.1)
 
@@ -218,9 +252,17 @@ class SerialProxy:
             self._pty2.fd, self._reader, self._pty2, self._pty1)
 
         try:
-            # Are all fds still connected (not in hangup state)?
+            # Are all fds still connected (not in hangup state)? The
+            # epoll fd becomes readable on the next HUP/ERR.
             while hup_count(poller.poll(0)) == 0:
-                await asyncio.sleep(0.1)
+                ready = loop.create_future()
+                loop.add_reader(
+                    poller.fileno(),
+                    lambda: ready.done() or ready.set_result(None))
+                try:
+                    await ready
+                finally:
+                    loop.remove_reader(poller.fileno())
         except asyncio.exceptions.CancelledError:
             # Task is stopped because we're shutting down. (loop.stop(),
             # possibly due to a fatal signal.)
@@ -233,21 +275,22 @@ class SerialProxy:
             loop.remove_reader(self._pty2.fd)
 
     def _reader(self, pty, peer_pty):
-        "Reader gets called once there is a byte available"
-        # We don't attempt to do multiple bytes at once. We assume that
-        # the baudrate/speed is sufficiently low that we can task switch
-        # easily. Remember: this is made for low baudrate tests.
-        # XXX: test this? does this statement make sense?
+        "Reader gets called once there are bytes available"
+        # Take everything that is available, until EAGAIN, before going
+        # back to the loop. The baudrate emulation is done on the
+        # writing side, one byte at a time.
         try:
-            byte = pty.read_byte()
+            while True:
+                data = pty.read_bytes()
+                if not data:
+                    break
+                peer_pty.write_bytes(data, pty.baudrate)
         except BaseException as e:
             loop = asyncio.get_running_loop()
             loop.remove_reader(pty.fd)
             loop.remove_reader(peer_pty.fd)
             if not isinstance(e, HangupError):
                 raise
-        else:
-            peer_pty.write_byte(byte, pty.baudrate)
 
     def close(self):
         "Clean up the file descriptors"
@@ -1,6 +1,6 @@
 import unittest
 
-from ctrlcode import SOH, ETX
+from ctrlcode import SOH, ETX, SOH_B, ETX_B
 
 
 class CtrlcodeTestCase(unittest.TestCase):
@@ -12,8 +12,8 @@ class CtrlcodeTestCase(unittest.TestCase):
 
     def test_in(self):
         self.assertIn(1, (SOH, ETX))
-        self.assertIn('\x03', (SOH, ETX))
-        self.assertIn(b'\x03', (SOH, ETX))
+        self.assertIn(b'\x03'[0], (SOH, ETX))
+        self.assertNotIn(2, (SOH, ETX))
 
     def test_int(self):
         self.assertEqual(SOH, 1)
@@ -22,28 +22,28 @@ class CtrlcodeTestCase(unittest.TestCase):
         self.assertNotEqual(ETX, 1)
         self.assertEqual(ETX, 3)
 
-    def test_byte(self):
-        self.assertEqual(SOH, b'\x01')
-        self.assertNotEqual(SOH, b'\x02')
+    def test_hash(self):
+        self.assertIn(SOH, {1: 'soh'})
+        self.assertEqual({SOH, ETX}, {1, 3})
 
-        self.assertNotEqual(ETX, b'\x01')
-        self.assertEqual(ETX, b'\x03')
+    def test_no_dict(self):
+        self.assertFalse(hasattr(SOH, '__dict__'))
+        self.assertIs(type(SOH).__eq__, int.__eq__)
 
-    def test_char(self):
-        self.assertEqual(SOH, '\x01')
-        self.assertNotEqual(SOH, '\x02')
+    def test_byte(self):
+        self.assertEqual(SOH_B, b'\x01')
+        self.assertNotEqual(SOH_B, b'\x02')
 
-        self.assertNotEqual(ETX, '\x01')
-        self.assertEqual(ETX, '\x03')
+        self.assertNotEqual(ETX_B, b'\x01')
+        self.assertEqual(ETX_B, b'\x03')
 
-    def test_must_be_one_byte(self):
-        self.assertNotEqual(SOH, '\x01\x01')
-        self.assertNotEqual(SOH, b'\x01\x01')
-        self.assertNotEqual(ETX, '\x03\x00')
-        self.assertNotEqual(ETX, b'\x03\x00')
+    def test_not_char(self):
+        self.assertNotEqual(SOH, '\x01')
+        self.assertNotEqual(SOH, b'\x01')
 
     def test_substring(self):
         self.assertEqual(bytearray([1, 2, 3])[0], SOH)
         self.assertEqual(bytearray([1, 2, 3])[2], ETX)
         self.assertEqual(bytes(bytearray([1, 2, 3]))[0], SOH)
         self.assertEqual(bytes(bytearray([1, 2, 3]))[2], ETX)
+        self.assertEqual(bytes(bytearray([1, 2, 3]))[0:1], SOH_B)
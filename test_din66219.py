@@ -1,7 +1,7 @@
 import unittest
 
 from ctrlcode import SOH, ETX
-from din66219 import append_bcc, check_bcc
+from din66219 import SWAR_MIN_SIZE, append_bcc, check_bcc
 
 
 class BccTestCase(unittest.TestCase):
@@ -13,6 +13,26 @@ class BccTestCase(unittest.TestCase):
             append_bcc(f'aaaaa{SOH}B0{ETX}'),
             b'aaaaa\x01B0\x03q')
 
+    def _check_append_bcc_size(self, size):
+        # STX, then size bytes of payload (ending in ETX) to XOR.
+        text = b'1.8.0(0034204.753*kWh)\r\n'
+        payload = (text * (size // len(text) + 1))[:size - 1] + b'\x03'
+        self.assertEqual(len(payload), size)
+        bcc = 0
+        for ch in payload:
+            bcc ^= ch
+        self.assertEqual(
+            append_bcc(b'\x02' + payload),
+            b'\x02' + payload + bytes([bcc]))
+        check_bcc(b'\x02' + payload + bytes([bcc]))
+
+    def test_append_bcc_sizes(self):
+        # Plain loop below SWAR_MIN_SIZE, SWAR fold at and above it
+        # (also for an odd size that needs uneven folding).
+        for size in (SWAR_MIN_SIZE - 1, SWAR_MIN_SIZE, 3 * SWAR_MIN_SIZE + 5):
+            with self.subTest(size=size):
+                self._check_append_bcc_size(size)
+
     def test_append_bcc_excess(self):
         with self.assertRaises(ValueError):
             append_bcc(f'{SOH}B0{ETX}x')
@@ -33,6 +53,10 @@ class BccTestCase(unittest.TestCase):
         with self.assertRaises(ValueError):
             check_bcc(f'{SOH}B0{ETX}qq')
 
+    def test_check_bcc_early_etx(self):
+        with self.assertRaises(ValueError):
+            check_bcc(b'\x01B0\x03\x03r')
+
     def test_check_bcc_little(self):
         with self.assertRaises(ValueError):
             check_bcc(f'{SOH}B0{ETX}')
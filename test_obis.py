@@ -1,6 +1,6 @@
 import unittest
 
-from obis import ElectricityObis
+from obis import ElectricityObis, MiscObis
 
 
 class ElectricityObisTestCase(unittest.TestCase):
@@ -28,11 +28,37 @@ class ElectricityObisTestCase(unittest.TestCase):
             obis.description,
             'Sum active instantaneous power (A+ - A-)')
 
+    def test_f_f(self):
+        obis = ElectricityObis.from_code('F.F')
+        self.assertIsInstance(obis, MiscObis)
+        self.assertEqual(obis.code, 'F.F.0')
+        self.assertEqual(obis.set_value('0000000').value, '0000000')
+
+    def test_c_1_0(self):
+        obis = ElectricityObis.from_code('C.1.0')
+        self.assertIsInstance(obis, MiscObis)
+        self.assertEqual((obis.c, obis.d, obis.e, obis.f), ('C', 1, 0, None))
+        self.assertEqual(obis.code, 'C.1.0')
+
+    def test_billing_period(self):
+        obis = ElectricityObis.from_code('1.8.0*01')
+        self.assertEqual((obis.c, obis.d, obis.e, obis.f), (1, 8, 0, 1))
+        self.assertEqual(obis.code, '1.8.0*1')
+        self.assertEqual(obis.unit, 'Wh')
+
+    def test_unparsable(self):
+        for code in ('', 'x', '1.8', '1.8.0.0', '1.8.x', '1.8.0*', '3.8.0',
+                     'C.1.0*01'):
+            with self.subTest(code=code):
+                with self.assertRaises(NotImplementedError):
+                    ElectricityObis.from_code(code)
+
     def test_value_set_and_convert_and_stringify(self):
         obis = ElectricityObis.from_code('1.8.0').set_value(1234, 'kWh')
         self.assertEqual(str(obis.value), '1234000 Wh')
         self.assertEqual('%s' % (obis.value,), '1234000 Wh')
         self.assertEqual(f'{obis.value}', '1234000 Wh')
+        self.assertEqual(f'{obis.value:.1f}', '1234000.0 Wh')
 
         with self.assertRaises(NotImplementedError):
             ElectricityObis.from_code('1.7.0').set_value(1234, 'kWh')
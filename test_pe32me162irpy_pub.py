@@ -0,0 +1,101 @@
+import asyncio
+import unittest
+from decimal import Decimal
+
+from pe32me162irpy_pub import (
+    Iec6205621CClient, SerialBufferProtocol, State, _find_etx_eot,
+    iter_iec6205621_datablock)
+
+
+class DatablockTestCase(unittest.TestCase):
+    READOUT = (
+        b'C.1.0(12345678)\r\n'
+        b'0.0.0(44455566)\r\n'
+        b'1.8.0(0034204.763*kWh)\r\n'
+        b'2.8.0(0001516.493*kWh)\r\n'
+        b'F.F(0000000)\r\n'
+        b'!\r\n')
+
+    def test_datablock(self):
+        # The caller strips the final "!" CR LF.
+        self.assertEqual(
+            list(iter_iec6205621_datablock(self.READOUT[0:-3])), [
+                ('C.1.0', '12345678', None),
+                ('0.0.0', '44455566', None),
+                ('1.8.0', Decimal('34204.763'), 'kWh'),
+                ('2.8.0', Decimal('1516.493'), 'kWh'),
+                ('F.F', '0000000', None),
+            ])
+
+    def test_datablock_empty(self):
+        self.assertEqual(list(iter_iec6205621_datablock(b'')), [])
+
+    def test_datablock_without_unit(self):
+        self.assertEqual(
+            list(iter_iec6205621_datablock(b'0.9.1(12:34:56)\r\n()\r\n')),
+            [('0.9.1', '12:34:56', None), ('', '', None)])
+
+    def test_datablock_end_line(self):
+        with self.assertRaises(ValueError):
+            list(iter_iec6205621_datablock(self.READOUT))
+
+    def test_datablock_garbage(self):
+        with self.assertRaises(ValueError):
+            list(iter_iec6205621_datablock(b'garbage\r\n'))
+        with self.assertRaises(ValueError):
+            list(iter_iec6205621_datablock(
+                b'1.8.0(0034204.763*kWh)\r\nx\r\n2.8.0(1*kWh)\r\n'))
+
+    def test_datablock_partial(self):
+        # Missing CR LF after the last dataset.
+        with self.assertRaises(ValueError):
+            list(iter_iec6205621_datablock(b'1.8.0(0034204.763*kWh)'))
+        # Unterminated value.
+        with self.assertRaises(ValueError):
+            list(iter_iec6205621_datablock(b'1.8.0(12)\r\n2.8.0(1\r\n'))
+
+
+class DatamessageFramingTestCase(unittest.TestCase):
+    def recv_datamessage(self, *chunks):
+        "Feed chunks 1ms apart; return (buf, rxbuf)"
+        async def recv():
+            client = Iec6205621CClient('/dev/null', processor=None)
+            client._loop = loop = asyncio.get_running_loop()
+            client._proto = proto = SerialBufferProtocol()
+            for i, chunk in enumerate(chunks):
+                loop.call_later(0.001 * i, proto.data_received, chunk)
+            state = State()
+            state.io = State.IO.R_READ_OBIS
+            buf = bytearray()
+            await asyncio.wait_for(
+                client.recv_datamessage(buf, state), timeout=1)
+            return bytes(buf), bytes(proto.rxbuf)
+        return asyncio.run(recv())
+
+    def test_find_etx_eot(self):
+        self.assertEqual(_find_etx_eot(b'\x02(1)'), -1)
+        self.assertEqual(_find_etx_eot(b'\x02(1)\x03q'), 4)
+        # EOT before ETX ends the message first.
+        self.assertEqual(_find_etx_eot(b'\x02(1)\x04x\x03q'), 4)
+        self.assertEqual(_find_etx_eot(b'\x02(1)\x03q\x04', 5), 6)
+
+    def test_bcc_is_etx(self):
+        frame = b'\x02(01)\x03\x03'
+        self.assertEqual(self.recv_datamessage(frame), (frame, b''))
+
+    def test_bcc_is_eot(self):
+        frame = b'\x02(42)\x03\x04'
+        self.assertEqual(self.recv_datamessage(frame), (frame, b''))
+
+    def test_chunks(self):
+        frame = b'\x02(0034204.763*kWh)\x03Q'
+        # Split everywhere, including between ETX and BCC. Bytes of the
+        # next message stay in rxbuf.
+        self.assertEqual(
+            self.recv_datamessage(
+                frame[:1], frame[1:8], frame[8:-1], frame[-1:] + b'\x15'),
+            (frame, b'\x15'))
+
+    def test_nak(self):
+        self.assertEqual(
+            self.recv_datamessage(b'\x15\x02(1)'), (b'', b'\x02(1)'))
@@ -0,0 +1,43 @@
+import asyncio
+import os
+import time
+import tty
+import unittest
+
+from serialproxy import SerialPty
+
+
+class SerialPtyTestCase(unittest.TestCase):
+    def setUp(self):
+        self.pty = SerialPty()
+        # Open the other end, so writes to the pty are not lost.
+        self.worker = os.open(self.pty._ptsname, os.O_RDWR | os.O_NOCTTY)
+        tty.setraw(self.worker)
+
+    def tearDown(self):
+        os.close(self.worker)
+        self.pty.close()
+
+    def test_late_writer_coalesces(self):
+        pty = self.pty
+        baudrate = pty.baudrate
+        pty._writebuf.extend((bytes([i]), baudrate) for i in range(65, 85))
+        # The writer woke up 5.5 byte-times late: 5 bytes are due.
+        pty._writelast = time.monotonic() - 5.5 * pty.time_per_byte
+        pty._background_write()
+
+        self.assertEqual(len(pty._writebuf), 15)
+        self.assertEqual(os.read(self.worker, 100), b'ABCDE')
+
+    def test_idle_writer_does_not_burst(self):
+        async def write():
+            pty = self.pty
+            pty._writelast = 0  # idle for a long time
+            pty.write_bytes(b'ABC', pty.baudrate)
+            # The first byte is written right away, the rest is paced.
+            remaining = len(pty._writebuf)
+            pty._drain_task.cancel()
+            return remaining
+
+        self.assertEqual(asyncio.run(write()), 2)
+        self.assertEqual(os.read(self.worker, 100), b'A')
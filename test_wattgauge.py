@@ -261,6 +261,10 @@ class WattGaugeTestCase(unittest.TestCase):
                     int(ms))
                 positive.set_active_energy_total(current_ms, value)
 
+    def test_no_dict(self):
+        self.assertFalse(hasattr(WattGauge(), '__dict__'))
+        self.assertFalse(hasattr(EnergyGauge(), '__dict__'))
+
 
 class EnergyGaugeTestCase(unittest.TestCase):
     def test_energygauge(self):
@@ -646,3 +650,40 @@ class EnergyGaugeTestCase(unittest.TestCase):
                     gauge.set_positive_active_energy_total(current_ms, value)
                 else:
                     gauge.set_negative_active_energy_total(current_ms, value)
+
+    def test_has_significant_change(self):
+        class FixedEnergyGauge(EnergyGauge):
+            __slots__ = ('_watt',)
+
+            def get_instantaneous_power(self):
+                return self._watt
+
+        inputs = (
+            # (wprev, watt, significant)
+            (100, 60, True),        # factor 0.6 is significant
+            (100, 61, False),
+            (100, 100, False),
+            (100, 159, False),
+            (100, 160, True),       # factor 1.6 is significant
+            (100, 0, True),
+            (-100, -60, True),
+            (-100, -61, False),
+            (-100, -159, False),
+            (-100, -160, True),
+            (-100, 0, True),
+            (5, 3, True),           # 0.6 exactly, also for small values
+            (5, 4, False),
+            (5, 8, True),           # 1.6 exactly
+            (100, -1, True),        # sign changes
+            (-100, 1, True),
+            (0, 19, False),         # around zero
+            (0, -19, False),
+            (0, 20, True),
+            (0, -20, True),
+        )
+
+        gauge = FixedEnergyGauge()
+        for wprev, watt, significant in inputs:
+            with self.subTest(wprev=wprev, watt=watt):
+                gauge._wprev, gauge._watt = wprev, watt
+                self.assertEqual(gauge.has_significant_change(), significant)
@@ -41,15 +41,20 @@ class WattGauge:
     schedule_every_x_seconds((lambda: (
         publish(prod.get_instantaneous_power()) and prod.reset())))
     """
+    __slots__ = (
+        '_t0', '_t1', '_t2', '_p0', '_p1', '_p2', '_tlast', '_watt',
+        '_data_valid')
+
     def __init__(self):
-        self._t = [0, 0, 0]  # t0, t(end-1), t(end)
-        self._p = [0, 0, 0]  # P(sum) in t[n]
+        self._t0 = self._t1 = self._t2 = 0  # t0, t(end-1), t(end)
+        self._p0 = self._p1 = self._p2 = 0  # P(sum) in t[n]
         self._tlast = 0      # latest time, even without changed data
         self._watt = 0       # average value, but only if it makes some sense
+        self._data_valid = False
 
     def get_active_energy_total(self):
         "Get the latest stored value in watt hours"
-        return self._p[2]
+        return self._p2
 
     def get_instantaneous_power(self):
         "Get a best guess of the current power usage in watt"
@@ -57,52 +62,49 @@ class WattGauge:
 
     def interval_since_last_change(self):
         "Is there anything report for this interval?"
-        return self._tlast - self._t[2]
+        return self._tlast - self._t2
 
     def set_active_energy_total(self, time_ms, current_wh):
         "Feed data to the WattGauge: do this often"
         self._tlast = time_ms
 
-        try:
-            self._data_valid
-        except AttributeError:
+        if not self._data_valid:
             # Happens only once after construction
-            self._t[0] = self._t[1] = self._t[2] = time_ms
-            self._p[0] = self._p[1] = self._p[2] = current_wh
+            self._t0 = self._t1 = self._t2 = time_ms
+            self._p0 = self._p1 = self._p2 = current_wh
             self._watt = 0
             self._data_valid = True
             return
 
         # If there was no change. Do nothing.
-        if current_wh == self._p[2]:
+        if current_wh == self._p2:
             # Except if there was activity earlier, but not anymore.
             # 60 W is 1 Wh/min, so let's recalculate based on the
             # latest values only.
-            if (self._tlast - self._t[2]) > 30000:
-                possible_watt = (1000 * 3600 // (self._tlast - self._t[2]))
+            idle = time_ms - self._t2
+            if idle > 30000:
+                possible_watt = (1000 * 3600 // idle)
                 if possible_watt < self._watt:
                     self._watt = possible_watt
             return
 
         # Set first change
-        if self._t[0] == self._t[1]:
-            self._t[1] = self._t[2] = time_ms
-            self._p[1] = self._p[2] = current_wh
+        if self._t0 == self._t1:
+            self._t1 = self._t2 = time_ms
+            self._p1 = self._p2 = current_wh
         # Update next to last change
         else:
-            self._t[1] = self._t[2]
-            self._p[1] = self._p[2]
-            self._t[2] = time_ms
-            self._p[2] = current_wh
+            self._t1, self._t2 = self._t2, time_ms
+            self._p1, self._p2 = self._p2, current_wh
 
         # If the difference between the deltas is large, then
         # force a reset based on the previous value.
         # - If delta between t[0] and t[1] is more than 60 seconds;
         # - and that is only one change (1 Wh);
         # - and recent changes are 4+ times faster.
-        if ((self._t[1] - self._t[0]) > 60000 and
-                (self._p[1] - self._p[0]) <= 1 and
-                (self._t[2] - self._t[1]) < 15000):
+        if ((self._t1 - self._t0) > 60000 and
+                (self._p1 - self._p0) <= 1 and
+                (self._t2 - self._t1) < 15000):
             # This fixes a quicker increase if usage suddenly spikes.
             self.reset()
 
@@ -116,38 +118,33 @@ class WattGauge:
         if self._there_are_enough_values:
             # We don't touch the _watt average. Also note that we update to
             # the latest time-in-which-there-was-a-change.
-            self._t[0] = self._t[1]
-            self._p[0] = self._p[1]
-            self._t[1] = self._t[2]
-            self._p[1] = self._p[2]
-
-    @property
-    def _tdelta(self):
-        return self._t[2] - self._t[0]
-
-    @property
-    def _pdelta(self):
-        return self._p[2] - self._p[0]
+            self._t0, self._t1 = self._t1, self._t2
+            self._p0, self._p1 = self._p1, self._p2
 
     @property
     def _there_are_enough_values(self):
+        return self._enough_values(self._t2 - self._t0, self._p2 - self._p0)
+
+    @staticmethod
+    def _enough_values(tdelta, pdelta):
         """
         Are there enough values to make any reasonable estimate?
         - Minimum sampling interval: 20s
         - Minimum sampling size: 6
         """
         return (
-            (self._tdelta >= 20000 and self._pdelta >= 6) or
-            (self._tdelta >= 50000 and self._pdelta >= 2) or
-            (self._tdelta >= 300000))
+            (tdelta >= 20000 and pdelta >= 6) or
+            (tdelta >= 50000 and pdelta >= 2) or
+            (tdelta >= 300000))
 
     def _recalculate_if_sensible(self):
         """
         Recalculate watt usage, but only if there are enough values
         """
-        if self._there_are_enough_values:
-            self._watt = self._pdelta * 1000 * 3600 // self._tdelta
-        elif (self._tlast - self._t[0]) > 300000:
+        tdelta, pdelta = self._t2 - self._t0, self._p2 - self._p0
+        if self._enough_values(tdelta, pdelta):
+            self._watt = pdelta * 3600000 // tdelta  # Wh/ms to W
+        elif (self._tlast - self._t0) > 300000:
             self._watt = 0
 
 
@@ -159,6 +156,8 @@ class EnergyGauge:
     The combination is needed because a proper estimate for either can
     only be given if the other is known to have a 0-delta.
     """
+    __slots__ = ('_positive', '_negative', '_wprev')
+
     def __init__(self):
         self._positive = WattGauge()
         self._negative = WattGauge()
@@ -185,8 +184,8 @@ class EnergyGauge:
         elif wprev == 0:
             return True     # otherwise a change from 0 is significant
 
-        factor = float(watt) / float(wprev)
-        if 0.6 < factor < 1.6:
+        # Same sign here, so 0.6 < watt/wprev < 1.6 becomes (in ints):
+        if 6 * abs(wprev) < 10 * abs(watt) < 16 * abs(wprev):
             return False    # change factor is small
 
         return True         # yes, significant